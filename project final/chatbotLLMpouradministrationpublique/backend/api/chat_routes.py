@@ -1,6 +1,11 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from services.chat_service import ChatService
+from llm.generation_limiter import OllamaOverloadedError
+
+# Seconds an overloaded client is asked to wait before retrying
+OVERLOAD_RETRY_AFTER = 5
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/api/chat')
 
@@ -29,6 +34,53 @@ def send_message():
         
         return jsonify(result), 200
         
+    except OllamaOverloadedError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(OVERLOAD_RETRY_AFTER)}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@chat_bp.route('/message/stream', methods=['POST'])
+@jwt_required()
+def send_message_stream():
+    """Send a message and stream the response as Server-Sent Events"""
+    try:
+        user_id = int(get_jwt_identity())
+        data = request.get_json()
+        
+        message = data.get('message')
+        conversation_id = data.get('conversation_id')
+        language = data.get('language')
+        
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+        
+        chat_service = ChatService()
+        
+        def generate():
+            events = chat_service.process_message_stream(
+                user_id=user_id,
+                message_content=message,
+                conversation_id=conversation_id,
+                language=language
+            )
+            try:
+                for event in events:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            except OllamaOverloadedError as e:
+                error = {'type': 'error', 'error': str(e), 'overloaded': True, 'retry_after': OVERLOAD_RETRY_AFTER}
+                yield f"event: error\ndata: {json.dumps(error)}\n\n"
+            except Exception as e:
+                yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+            finally:
+                # Runs when the client disconnects too: closing the turn cancels its generation
+                events.close()
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
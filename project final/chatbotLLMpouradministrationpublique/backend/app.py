@@ -5,6 +5,7 @@ from config import config
 from database import db
 from api import register_blueprints
 from models import User, Conversation, Message, Document
+from services.chat_service import rag_service_singleton
 import os
 
 def create_app(config_name='default'):
@@ -27,10 +28,26 @@ def create_app(config_name='default'):
         db.create_all()
         print("Database tables created")
     
+    # Keep the retrieval index in sync with the documents table
+    rag_service_singleton.init_app(app)
+    
     @app.route('/api/health', methods=['GET'])
     def health_check():
         """Health check endpoint"""
-        return {'status': 'healthy', 'message': 'Server is running'}, 200
+        return {
+            'status': 'healthy',
+            'message': 'Server is running',
+            'translation_cache': rag_service_singleton.translation_service.cache.stats(),
+            'translation_models': rag_service_singleton.translation_service.registry.stats(),
+            'translation_batches': rag_service_singleton.translation_service.batcher.stats(),
+            'translation_backfill_batches': rag_service_singleton.translation_service.backfill_batcher.stats(),
+            'ollama': rag_service_singleton.local_model.ollama.stats(),
+            'prompt_tokens': rag_service_singleton.local_model.prompt_builder.stats(),
+            'model_router': rag_service_singleton.local_model.router.stats(),
+            'answer_cache': rag_service_singleton.answer_cache.stats(),
+            'inflight': rag_service_singleton.inflight.stats(),
+            'pipeline_stages': rag_service_singleton.stage_stats.stats()
+        }, 200
     
     return app
 
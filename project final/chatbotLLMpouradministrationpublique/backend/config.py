@@ -18,6 +18,81 @@ class Config:
     # ChromaDB
     CHROMA_PERSIST_DIRECTORY = './chroma_db'
     
+    # Retrieval index
+    CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 800))  # characters per passage
+    CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 150))
+    INDEX_RECONCILE_INTERVAL = int(os.getenv('INDEX_RECONCILE_INTERVAL', 300))  # seconds, 0 disables
+    TRANSLATION_MATERIALIZE_INTERVAL = int(os.getenv('TRANSLATION_MATERIALIZE_INTERVAL', 600))  # seconds, 0 disables
+    TRANSLATION_MATERIALIZE_RETRY_AFTER = int(os.getenv('TRANSLATION_MATERIALIZE_RETRY_AFTER', 3600))  # seconds before an untranslatable passage is retried
+    TRANSLATION_MATERIALIZE_FAILED_MAX = int(os.getenv('TRANSLATION_MATERIALIZE_FAILED_MAX', 10000))  # untranslatable passages remembered
+    
+    # Translation cache (memory LRU tier + SQLite disk tier)
+    TRANSLATION_CACHE_PATH = os.getenv('TRANSLATION_CACHE_PATH', './cache/translations.sqlite3')
+    TRANSLATION_CACHE_MEMORY_ENTRIES = int(os.getenv('TRANSLATION_CACHE_MEMORY_ENTRIES', 4096))
+    TRANSLATION_CACHE_DISK_MB = int(os.getenv('TRANSLATION_CACHE_DISK_MB', 256))
+    
+    # Translation model registry
+    TRANSLATION_MODEL_BUDGET_MB = int(os.getenv('TRANSLATION_MODEL_BUDGET_MB', 2048))
+    TRANSLATION_MODEL_FAILURE_TTL = int(os.getenv('TRANSLATION_MODEL_FAILURE_TTL', 600))  # seconds
+    TRANSLATION_INFERENCE_MODE = os.getenv('TRANSLATION_INFERENCE_MODE', 'fp32')  # fp32, int8 or bf16
+    
+    # Translation micro-batching across concurrent requests
+    TRANSLATION_BATCH_MAX_SIZE = int(os.getenv('TRANSLATION_BATCH_MAX_SIZE', 16))
+    TRANSLATION_BATCH_MAX_WAIT_MS = float(os.getenv('TRANSLATION_BATCH_MAX_WAIT_MS', 5))
+    TRANSLATION_BACKFILL_BATCH_SIZE = int(os.getenv('TRANSLATION_BACKFILL_BATCH_SIZE', 4))  # ingest-time backfill only
+    
+    # Ollama HTTP client
+    OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+    OLLAMA_BASE_URLS = os.getenv('OLLAMA_BASE_URLS', OLLAMA_BASE_URL).split(',')  # generation pool, comma-separated
+    OLLAMA_POOL_SIZE = int(os.getenv('OLLAMA_POOL_SIZE', 16))  # keep-alive connections per host
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', 3))  # seconds
+    OLLAMA_READ_TIMEOUT = float(os.getenv('OLLAMA_READ_TIMEOUT', 120))  # seconds
+    OLLAMA_MAX_RETRIES = int(os.getenv('OLLAMA_MAX_RETRIES', 3))  # idempotent calls only
+    OLLAMA_RETRY_BACKOFF = float(os.getenv('OLLAMA_RETRY_BACKOFF', 0.5))  # seconds, doubled per retry
+    OLLAMA_MAX_CONCURRENCY = int(os.getenv('OLLAMA_MAX_CONCURRENCY', 4))  # generations in flight per backend
+    OLLAMA_MAX_QUEUE = int(os.getenv('OLLAMA_MAX_QUEUE', 16))  # callers waiting for a slot before 503
+    OLLAMA_QUEUE_TIMEOUT = float(os.getenv('OLLAMA_QUEUE_TIMEOUT', 15))  # seconds a caller waits for a slot before 503
+    OLLAMA_BREAKER_FAILURES = int(os.getenv('OLLAMA_BREAKER_FAILURES', 3))  # consecutive failures that open the circuit
+    OLLAMA_BREAKER_RESET = float(os.getenv('OLLAMA_BREAKER_RESET', 30))  # seconds before a trial call
+    OLLAMA_HEALTH_INTERVAL = int(os.getenv('OLLAMA_HEALTH_INTERVAL', 10))  # seconds between health probes (0 disables)
+    OLLAMA_MODEL_REFRESH_INTERVAL = int(os.getenv('OLLAMA_MODEL_REFRESH_INTERVAL', 60))  # seconds between model discovery runs
+    
+    # Prompt prefix reuse (Ollama re-evaluates only what changed since the last request)
+    OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')  # how long the model stays loaded after a request
+    OLLAMA_CONTEXT_MODE = os.getenv('OLLAMA_CONTEXT_MODE', 'false').lower() == 'true'  # continue conversations from /api/generate context tokens
+    OLLAMA_CONTEXT_MAX_TOKENS = int(os.getenv('OLLAMA_CONTEXT_MAX_TOKENS', 3072))  # restart from text history beyond this
+    OLLAMA_CONTEXT_CONVERSATIONS = int(os.getenv('OLLAMA_CONTEXT_CONVERSATIONS', 256))  # stored context arrays (LRU)
+    
+    # Prompt token budget (system prompt, then passages, then recent turns)
+    OLLAMA_NUM_CTX = int(os.getenv('OLLAMA_NUM_CTX', 4096))  # model context window; must hold budget + answer
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 2560))
+    
+    # Rolling conversation summaries
+    SUMMARY_KEEP_RECENT = int(os.getenv('SUMMARY_KEEP_RECENT', 6))  # latest messages sent verbatim
+    SUMMARY_BATCH = int(os.getenv('SUMMARY_BATCH', 6))  # older messages needed before the summary is updated
+    SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', 300))
+    
+    # Answer cache for repeat first questions (invalidated when a source document changes)
+    ANSWER_CACHE_ENTRIES = int(os.getenv('ANSWER_CACHE_ENTRIES', 1024))
+    ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 3600))  # seconds
+    
+    # Small/large model routing (simple questions go to the small model)
+    MODEL_ROUTER_ENABLED = os.getenv('MODEL_ROUTER_ENABLED', 'true').lower() == 'true'
+    SMALL_MODEL_PRIORITY = os.getenv('SMALL_MODEL_PRIORITY', 'qwen2.5:3b,llama3.2:3b,phi3:mini,qwen2.5:1.5b').split(',')
+    MODEL_LATENCY_BUDGET = float(os.getenv('MODEL_LATENCY_BUDGET', 20))  # seconds, p90 of Ollama generating a full answer
+    ROUTER_LONG_QUESTION_WORDS = int(os.getenv('ROUTER_LONG_QUESTION_WORDS', 25))
+    ROUTER_MIN_CONFIDENCE = float(os.getenv('ROUTER_MIN_CONFIDENCE', 0.5))  # share of question terms in the top passage
+    ROUTER_DEEP_CONVERSATION = int(os.getenv('ROUTER_DEEP_CONVERSATION', 6))  # past messages
+    ROUTER_LATENCY_WINDOW = float(os.getenv('ROUTER_LATENCY_WINDOW', 600))  # seconds of latency samples kept
+    ROUTER_PROBE_EVERY = int(os.getenv('ROUTER_PROBE_EVERY', 10))  # while downgrading, every Nth complex question still uses the large model
+    
+    # Request pipeline: independent stages run concurrently on a shared pool
+    PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', 8))
+    
+    # Direct multilingual generation: these languages skip the French round trip
+    # when the model is known to handle them (LocalModelService.model_languages)
+    DIRECT_LANGUAGES = [lang.strip() for lang in os.getenv('DIRECT_LANGUAGES', 'ar,en').split(',') if lang.strip()]
+    
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
 
@@ -0,0 +1,110 @@
+"""
+Answer Cache - Final answers for repeat questions
+Keyed on the normalized French question, the retrieved passages with their
+document versions, the model and the answer language; entries are dropped
+when a contributing document changes
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+from llm.bm25_index import normalize_text
+
+WHITESPACE = re.compile(r"\s+")
+TRAILING_PUNCTUATION = " ?!.؟¿"
+
+
+def normalize_question(question: str) -> str:
+    """Case, accents, spacing and final punctuation do not change the answer"""
+    return WHITESPACE.sub(' ', normalize_text(question)).strip().rstrip(TRAILING_PUNCTUATION)
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 1024, ttl: int = 3600):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum cached answers (least recently used are evicted)
+            ttl: Seconds an answer is served before it is regenerated
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict, Tuple[int, ...]]]" = OrderedDict()
+        self._by_document: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(question_fr: str, passages: Iterable[Tuple[int, int, object]], model: str, language: str) -> str:
+        """Hash of (normalized question, ranked (doc id, position, version) passages, model, answer language)"""
+        parts = [model or '', language, normalize_question(question_fr)]
+        parts += [f"{doc_id}:{position}:{version}" for doc_id, position, version in passages]
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached result or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, result, _ = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: Dict, document_ids: Iterable[int]):
+        """Store a result, remembering which documents it was built from"""
+        document_ids = tuple(set(document_ids))
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic(), result, document_ids)
+            for doc_id in document_ids:
+                self._by_document.setdefault(doc_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, document_ids: Iterable[int] = None):
+        """Drop answers built from the given documents (all answers if None); an index change listener"""
+        with self._lock:
+            if document_ids is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._by_document.clear()
+                return
+            for doc_id in list(document_ids):
+                for key in list(self._by_document.get(doc_id, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def _drop(self, key):
+        _, _, document_ids = self._entries.pop(key)
+        for doc_id in document_ids:
+            keys = self._by_document.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_document[doc_id]
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations
+            }
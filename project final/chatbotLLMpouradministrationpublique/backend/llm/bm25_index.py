@@ -0,0 +1,151 @@
+"""
+BM25 Index - In-memory inverted index for document retrieval
+Holds pre-normalized postings so queries never scan the documents table
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Arabic letter variants folded to a single form before indexing
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي', 'ـ': None
+})
+
+# Very common words that carry no retrieval signal (stored already normalized)
+STOPWORDS = {
+    # French
+    'le', 'la', 'les', 'un', 'une', 'des', 'du', 'de', 'et', 'ou', 'en', 'au', 'aux',
+    'ce', 'ces', 'cet', 'cette', 'est', 'sont', 'pour', 'par', 'sur', 'dans', 'avec',
+    'que', 'qui', 'quoi', 'comment', 'je', 'tu', 'il', 'elle', 'nous', 'vous', 'ils',
+    'mon', 'ma', 'mes', 'ton', 'ta', 'tes', 'son', 'sa', 'ses', 'votre', 'vos', 'notre',
+    'ne', 'pas', 'se', 'si', 'me', 'te', 'etre', 'avoir', 'faire', 'veux', 'peux',
+    # English
+    'the', 'of', 'and', 'or', 'to', 'in', 'on', 'for', 'is', 'are', 'an', 'how', 'what',
+    'do', 'can', 'my', 'your', 'with', 'it', 'be', 'get',
+    # Arabic
+    'في', 'من', 'الي', 'علي', 'عن', 'هل', 'ما', 'ماذا', 'كيف', 'او', 'و', 'ان', 'هذا', 'هذه'
+}
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip diacritics and fold Arabic letter variants"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.translate(ARABIC_FOLDING)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized index terms"""
+    if not text:
+        return []
+    return [
+        token for token in TOKEN_PATTERN.findall(normalize_text(text))
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """Initialize an empty index"""
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        self.doc_terms: Dict[Hashable, Tuple[str, ...]] = {}
+        self.doc_lengths: Dict[Hashable, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.doc_lengths
+
+    def build(self, entries: Iterable[Tuple[Hashable, str]]):
+        """Replace the whole index with the given (key, text) entries"""
+        with self._lock:
+            self._reset()
+            for key, text in entries:
+                self._add(key, text)
+
+    def add(self, key: Hashable, text: str):
+        """Insert or replace a single entry"""
+        with self._lock:
+            self._remove(key)
+            self._add(key, text)
+
+    def remove(self, key: Hashable):
+        """Remove an entry if it is indexed"""
+        with self._lock:
+            self._remove(key)
+
+    def _add(self, key, text):
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[key] = tf
+        length = sum(counts.values())
+        self.doc_terms[key] = tuple(counts)
+        self.doc_lengths[key] = length
+        self.total_length += length
+
+    def _remove(self, key):
+        if key not in self.doc_lengths:
+            return
+        for term in self.doc_terms.pop(key):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(key, None)
+            if not posting:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(key)
+
+    def coverage(self, query: str, key: Hashable) -> float:
+        """Share of the query's idf weight carried by terms the passage contains (0 to 1)"""
+        terms = set(tokenize(query))
+        with self._lock:
+            passage_terms = set(self.doc_terms.get(key, ()))
+            n_docs = len(self.doc_lengths)
+            total = found = 0.0
+            for term in terms:
+                df = len(self.postings.get(term, ()))
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                total += idf
+                if term in passage_terms:
+                    found += idf
+        return found / total if total else 0.0
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, Hashable]]:
+        """Return the top_k (score, key) pairs for the query, best first"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = len(self.doc_lengths)
+            if n_docs == 0:
+                return []
+            avg_length = self.total_length / n_docs or 1.0
+
+            scores: Dict[Hashable, float] = {}
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for key, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[key] / avg_length)
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(top_k, ((score, key) for key, score in scores.items()), key=lambda item: item[0])
@@ -0,0 +1,85 @@
+"""
+Cancellation - Stop a chat turn's work when nobody is waiting for it
+A token is created per turn and passed down from the HTTP layer; the Ollama
+stream, queued translation batches and pending pipeline stages register
+callbacks on it, so cancelling closes connections and drops queued work
+instead of only being noticed at the next check
+"""
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+
+class RequestCancelled(Exception):
+    """The turn was cancelled (client gone or message resent)"""
+
+
+class CancellationToken:
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self.key: Optional[Hashable] = None  # set by CancellationRegistry
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'cancelled'):
+        """Cancel once and run the registered callbacks"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error running cancellation callback: {e}")
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run callback when the token is cancelled (right away if it already is)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove(self, callback: Optional[Callable[[], None]]):
+        """Unregister a callback whose resource is no longer in use"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+
+class CancellationRegistry:
+    def __init__(self):
+        """One active token per key (e.g. user and conversation)"""
+        self._active: Dict[Hashable, CancellationToken] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key: Hashable) -> CancellationToken:
+        """Start a turn for key, cancelling the turn it replaces"""
+        token = CancellationToken()
+        token.key = key
+        with self._lock:
+            previous = self._active.get(key)
+            self._active[key] = token
+        if previous is not None:
+            previous.cancel('superseded by a newer message')
+        return token
+
+    def end(self, token: CancellationToken):
+        with self._lock:
+            if self._active.get(token.key) is token:
+                del self._active[token.key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'active_turns': len(self._active)}
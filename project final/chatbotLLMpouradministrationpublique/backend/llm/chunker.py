@@ -0,0 +1,89 @@
+"""
+Chunker - Splits document content into overlapping passages at ingest time
+Passages keep their character offsets so they can be traced back to the parent document
+"""
+import hashlib
+from typing import Dict, List, Tuple
+from config import Config
+
+# Preferred break points, best first
+BREAKS = ['\n\n', '\n', '. ', '? ', '! ', '؟ ', '; ', ' ']
+
+
+def split_passages(text: str, size: int = None, overlap: int = None) -> List[Tuple[int, int]]:
+    """
+    Split text into overlapping passages.
+
+    Args:
+        text: Document content
+        size: Maximum passage length in characters
+        overlap: Characters shared between consecutive passages
+
+    Returns:
+        List of (start, end) character offsets
+    """
+    size = size or Config.CHUNK_SIZE
+    overlap = Config.CHUNK_OVERLAP if overlap is None else overlap
+    overlap = min(overlap, size // 2)
+
+    spans = []
+    length = len(text)
+    start = _skip_whitespace(text, 0)
+
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            end = _find_break(text, start + size // 2, end)
+
+        stripped_end = end
+        while stripped_end > start and text[stripped_end - 1].isspace():
+            stripped_end -= 1
+        if stripped_end > start:
+            spans.append((start, stripped_end))
+
+        if end >= length:
+            break
+
+        # Step back by the overlap, then forward to the next word boundary
+        next_start = max(end - overlap, start + 1)
+        while next_start < end and not text[next_start - 1].isspace():
+            next_start += 1
+        start = _skip_whitespace(text, next_start)
+
+    return spans
+
+
+def _find_break(text, lower, upper):
+    for separator in BREAKS:
+        position = text.rfind(separator, lower, upper)
+        if position != -1:
+            return position + len(separator)
+    return upper
+
+
+def _skip_whitespace(text, position):
+    while position < len(text) and text[position].isspace():
+        position += 1
+    return position
+
+
+def content_hash(text: str) -> str:
+    """Stable key for a passage's text"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def chunk_rows(document_id: int, content: str, language: str) -> List[Dict]:
+    """Build document_chunks rows for a document"""
+    rows = []
+    for position, (start, end) in enumerate(split_passages(content or '')):
+        passage = content[start:end]
+        rows.append({
+            'document_id': document_id,
+            'position': position,
+            'start_offset': start,
+            'end_offset': end,
+            'content': passage,
+            'content_hash': content_hash(passage),
+            'language': language or 'fr'
+        })
+    return rows
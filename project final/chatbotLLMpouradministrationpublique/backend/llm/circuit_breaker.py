@@ -0,0 +1,97 @@
+"""
+Circuit Breaker - Stop calling a backend that keeps failing
+closed: calls go through; after failure_threshold consecutive failures the circuit opens
+open: calls are refused at once until reset_timeout has passed
+half-open: a single trial call is let through; success closes the circuit, failure reopens it
+"""
+import threading
+import time
+from typing import Dict
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30, name: str = 'backend'):
+        """
+        Initialize the breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial call is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """True if a call may be attempted now (callers must then record its outcome)"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """A call succeeded: close the circuit"""
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"✓ Circuit for {self.name} closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """A call failed: open the circuit once the threshold is reached, or at once when half-open"""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def half_open(self):
+        """Allow a trial call now instead of waiting out the reset timeout (e.g. a health probe succeeded)"""
+        with self._lock:
+            if self._state == OPEN:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+
+    def _open(self):
+        if self._state != OPEN:
+            print(f"WARNING: Circuit for {self.name} opened; calls are refused for {self.reset_timeout:.0f}s")
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict:
+        """State, consecutive failures and refused calls"""
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,93 @@
+"""
+Conversation Summarizer - Folds old turns into a rolling summary on the conversation
+Runs in a background worker after each assistant reply, so prompts carry the
+summary plus a short recent window however long the conversation gets
+"""
+import threading
+from typing import List, Set
+from database import db
+from models.conversation import Conversation
+from models.message import Message
+
+
+class ConversationSummarizer:
+    def __init__(self, local_model, keep_recent: int = 6, batch: int = 6):
+        """
+        Initialize the summarizer.
+
+        Args:
+            local_model: LocalModelService used to write the summaries
+            keep_recent: Latest messages always left out of the summary
+            batch: Minimum number of older messages before the summary is updated
+        """
+        self.local_model = local_model
+        self.keep_recent = keep_recent
+        self.batch = batch
+        self._pending: Set[int] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+
+    def recent_messages(self, conversation: Conversation) -> List[Message]:
+        """Messages not yet folded into the conversation summary, oldest first"""
+        query = Message.query.filter_by(conversation_id=conversation.id)
+        if conversation.summary_until_id:
+            query = query.filter(Message.id > conversation.summary_until_id)
+        return query.order_by(Message.created_at, Message.id).all()
+
+    def summarize(self, conversation_id: int) -> bool:
+        """
+        Fold messages older than the recent window into the summary (requires app context).
+
+        Returns:
+            True if the summary was updated
+        """
+        conversation = Conversation.query.get(conversation_id)
+        if not conversation:
+            return False
+
+        messages = self.recent_messages(conversation)
+        older = messages[:-self.keep_recent] if self.keep_recent else messages
+        if len(older) < self.batch:
+            return False
+
+        summary = self.local_model.summarize(
+            conversation.summary,
+            [{"role": msg.role, "content": msg.content} for msg in older]
+        )
+        if not summary:
+            return False
+
+        conversation.summary = summary
+        conversation.summary_until_id = older[-1].id
+        db.session.commit()
+        print(f"Summarized {len(older)} messages of conversation {conversation_id}")
+        return True
+
+    def schedule(self, conversation_id: int):
+        """Queue a conversation for summarization after a reply"""
+        with self._lock:
+            self._pending.add(conversation_id)
+        self._wake.set()
+
+    def start(self, app):
+        """Summarize scheduled conversations in a daemon thread"""
+        if self._worker is not None:
+            return
+
+        def loop():
+            while True:
+                self._wake.wait()
+                self._wake.clear()
+                with self._lock:
+                    pending, self._pending = self._pending, set()
+                for conversation_id in pending:
+                    try:
+                        with app.app_context():
+                            self.summarize(conversation_id)
+                            db.session.remove()
+                    except Exception as e:
+                        print(f"Error summarizing conversation {conversation_id}: {e}")
+
+        self._worker = threading.Thread(target=loop, name='conversation-summarizer', daemon=True)
+        self._worker.start()
@@ -0,0 +1,104 @@
+"""
+Generation Limiter - Bounded waiting and backpressure for Ollama generations
+The pool counts slots per backend; when every usable backend is full, a
+bounded number of callers wait for a slot, each for a bounded time, and
+anyone beyond that is rejected immediately instead of letting the request
+time out behind a backlog.
+
+Generation stays on the synchronous OllamaService: the Flask app serves each
+request on its own thread, so an asyncio client would have to run its own
+event loop per call without freeing that thread. Capping slots and the
+waiting queue here is what keeps those threads from piling up.
+"""
+import threading
+import time
+from typing import Callable, Dict, TypeVar
+from llm.cancellation import CancellationToken
+
+T = TypeVar('T')
+
+# Returned by try_acquire when every candidate slot is taken
+FULL = object()
+
+
+class OllamaOverloadedError(RuntimeError):
+    """Raised when every generation slot is busy and the waiting queue is full or the wait ran out"""
+
+    def __init__(self, in_flight: int, waiting: int):
+        super().__init__(
+            f"Ollama is overloaded ({in_flight} generations in flight, {waiting} waiting); retry later"
+        )
+        self.in_flight = in_flight
+        self.waiting = waiting
+
+
+class GenerationLimiter:
+    def __init__(self, max_queue: int, max_wait: float):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_queue: Callers allowed to wait for a slot before new ones are rejected
+            max_wait: Seconds a caller waits for a slot before it is rejected
+        """
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Reentrant: the owner also uses it as the lock around its slot counts
+        self.condition = threading.Condition(threading.RLock())
+
+    def acquire(self, try_acquire: Callable[[], T], in_flight: Callable[[], int],
+                cancel: CancellationToken = None) -> T:
+        """
+        Return try_acquire()'s result, waiting while it returns FULL.
+
+        try_acquire and in_flight are called with the condition held; the
+        owner calls release() whenever it frees a slot.
+        """
+        with self.condition:
+            result = try_acquire()
+            if result is not FULL:
+                return result
+            # Fail fast instead of queueing behind a backlog that would only time out
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise OllamaOverloadedError(in_flight(), self.waiting)
+
+            self.waiting += 1
+            wake = self.release
+            if cancel is not None:
+                cancel.on_cancel(wake)
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while True:
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        raise OllamaOverloadedError(in_flight(), self.waiting - 1)
+                    self.condition.wait(remaining)
+                    result = try_acquire()
+                    if result is not FULL:
+                        return result
+            finally:
+                self.waiting -= 1
+                if cancel is not None:
+                    cancel.remove(wake)
+
+    def release(self):
+        """Wake the waiters so they try again (a slot was freed or a turn cancelled)"""
+        with self.condition:
+            self.condition.notify_all()
+
+    def stats(self) -> Dict:
+        with self.condition:
+            return {
+                'max_queue': self.max_queue,
+                'max_wait': self.max_wait,
+                'waiting': self.waiting,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out
+            }
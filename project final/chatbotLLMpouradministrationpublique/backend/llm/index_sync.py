@@ -0,0 +1,299 @@
+"""
+Index Sync - Keeps the in-memory BM25 index in step with the documents table
+Chunks documents at ingest, pushes deltas from SQLAlchemy events and
+periodically reconciles against the DB
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from database import db
+from models.document import Document as DocumentModel
+from models.document_chunk import DocumentChunk
+from llm.bm25_index import BM25Index
+from llm.chunker import chunk_rows
+
+PENDING_KEY = 'document_index_deltas'
+
+# (position, passage text) pairs for one document
+Passages = List[Tuple[int, str]]
+
+
+def passage_text(title: str, content: str) -> str:
+    """Text indexed for a passage (the title boosts every passage of a document)"""
+    return f"{title}\n{content}"
+
+
+class DocumentIndexSync:
+    def __init__(self, index: BM25Index):
+        """Initialize sync state for the given index; keys are (document_id, position)"""
+        self.index = index
+        self.versions: Dict[int, Optional[datetime]] = {}
+        self.positions: Dict[int, List[int]] = {}
+        self.ready = False
+        self._lock = threading.Lock()
+        self._listeners_registered = False
+        self._reconciler = None
+        self.change_listeners: List[Callable[[Iterable[int]], None]] = []
+
+    # ------------------------------------------------------------------
+    # Index updates
+    # ------------------------------------------------------------------
+
+    def rebuild(self):
+        """Build the whole index from stored passages of active documents (requires app context)"""
+        self.backfill_chunks()
+
+        rows = db.session.query(
+            DocumentChunk.document_id, DocumentChunk.position, DocumentChunk.content,
+            DocumentModel.title, DocumentModel.updated_at
+        ).join(DocumentModel, DocumentChunk.document_id == DocumentModel.id).filter(
+            DocumentModel.active.is_(True)
+        ).yield_per(1000)
+
+        versions = {}
+        positions = {}
+
+        def entries():
+            for doc_id, position, content, title, updated_at in rows:
+                versions[doc_id] = updated_at
+                positions.setdefault(doc_id, []).append(position)
+                yield (doc_id, position), passage_text(title, content)
+
+        self.index.build(entries())
+        with self._lock:
+            self.versions = versions
+            self.positions = positions
+        self.ready = True
+        print(f"BM25 index built with {len(self.index)} passages from {len(versions)} documents")
+
+    def backfill_chunks(self) -> int:
+        """Chunk active documents that were stored before chunking existed"""
+        missing = DocumentModel.query.filter(
+            DocumentModel.active.is_(True),
+            ~db.exists().where(DocumentChunk.document_id == DocumentModel.id)
+        ).all()
+        if not missing:
+            return 0
+
+        for doc in missing:
+            rows = chunk_rows(doc.id, doc.content, doc.language)
+            if rows:
+                db.session.execute(DocumentChunk.__table__.insert(), rows)
+        db.session.commit()
+        print(f"Chunked {len(missing)} existing documents")
+        return len(missing)
+
+    def upsert(self, doc_id: int, title: str, passages: Passages, updated_at: Optional[datetime]):
+        """Index or re-index the passages of a single active document"""
+        with self._lock:
+            old_positions = self.positions.get(doc_id, [])
+        new_positions = [position for position, _ in passages]
+
+        for position, content in passages:
+            self.index.add((doc_id, position), passage_text(title, content))
+        for position in set(old_positions) - set(new_positions):
+            self.index.remove((doc_id, position))
+
+        with self._lock:
+            self.versions[doc_id] = updated_at
+            self.positions[doc_id] = new_positions
+
+    def remove(self, doc_id: int):
+        """Drop a deleted or deactivated document from the index"""
+        with self._lock:
+            old_positions = self.positions.pop(doc_id, [])
+            self.versions.pop(doc_id, None)
+        for position in old_positions:
+            self.index.remove((doc_id, position))
+
+    def add_change_listener(self, listener: Callable[[Iterable[int]], None]):
+        """Call listener(document_ids) whenever documents change in the index"""
+        self.change_listeners.append(listener)
+
+    def _notify(self, doc_ids):
+        for listener in self.change_listeners:
+            try:
+                listener(doc_ids)
+            except Exception as e:
+                print(f"Error in index change listener: {e}")
+
+    def _rechunk(self, doc_ids) -> Dict[int, Passages]:
+        """
+        Chunk documents from their current content, rewriting stored chunks that
+        no longer match it (content edited outside the ORM hooks)
+        """
+        stored = {}
+        for doc_id, position, chunk_hash, language in db.session.query(
+            DocumentChunk.document_id, DocumentChunk.position, DocumentChunk.content_hash, DocumentChunk.language
+        ).filter(DocumentChunk.document_id.in_(doc_ids)).order_by(
+            DocumentChunk.document_id, DocumentChunk.position
+        ):
+            stored.setdefault(doc_id, []).append((position, chunk_hash, language))
+
+        passages = {}
+        rewritten = 0
+        chunks = DocumentChunk.__table__
+        for doc_id, content, language in db.session.query(
+            DocumentModel.id, DocumentModel.content, DocumentModel.language
+        ).filter(DocumentModel.id.in_(doc_ids)):
+            rows = chunk_rows(doc_id, content, language)
+            current = [(row['position'], row['content_hash'], row['language']) for row in rows]
+            if current != stored.get(doc_id, []):
+                db.session.execute(chunks.delete().where(chunks.c.document_id == doc_id))
+                if rows:
+                    db.session.execute(chunks.insert(), rows)
+                rewritten += 1
+            passages[doc_id] = [(row['position'], row['content']) for row in rows]
+
+        if rewritten:
+            db.session.commit()
+            print(f"Re-chunked {rewritten} documents changed outside the ORM")
+        return passages
+
+    # ------------------------------------------------------------------
+    # SQLAlchemy events
+    # ------------------------------------------------------------------
+
+    def register_listeners(self):
+        """Attach Document and session hooks (once per process)"""
+        if self._listeners_registered:
+            return
+        event.listen(DocumentModel, 'after_insert', self._on_document_saved)
+        event.listen(DocumentModel, 'after_update', self._on_document_saved)
+        event.listen(DocumentModel, 'before_delete', self._on_document_deleting)
+        event.listen(DocumentModel, 'after_delete', self._on_document_deleted)
+        event.listen(Session, 'after_commit', self._on_commit)
+        event.listen(Session, 'after_soft_rollback', self._on_rollback)
+        self._listeners_registered = True
+
+    def _on_document_saved(self, mapper, connection, target):
+        passages = self._sync_chunks(connection, target)
+
+        # Deltas are only applied to the index once the transaction commits
+        session = Session.object_session(target)
+        if session is None:
+            return
+        if target.active:
+            delta = ('upsert', target.title, passages, target.updated_at)
+        else:
+            delta = ('remove',)
+        session.info.setdefault(PENDING_KEY, {})[target.id] = delta
+
+    def _sync_chunks(self, connection, target) -> Passages:
+        """Re-chunk the document inside the flush when its content changed"""
+        chunks = DocumentChunk.__table__
+        state = inspect(target)
+        content_changed = (
+            state.attrs.content.history.has_changes()
+            or state.attrs.language.history.has_changes()
+        )
+
+        if not content_changed:
+            rows = connection.execute(
+                db.select(chunks.c.position, chunks.c.content)
+                .where(chunks.c.document_id == target.id)
+                .order_by(chunks.c.position)
+            ).all()
+            if rows:
+                return [(position, content) for position, content in rows]
+
+        rows = chunk_rows(target.id, target.content, target.language)
+        connection.execute(chunks.delete().where(chunks.c.document_id == target.id))
+        if rows:
+            connection.execute(chunks.insert(), rows)
+        return [(row['position'], row['content']) for row in rows]
+
+    def _on_document_deleting(self, mapper, connection, target):
+        chunks = DocumentChunk.__table__
+        connection.execute(chunks.delete().where(chunks.c.document_id == target.id))
+
+    def _on_document_deleted(self, mapper, connection, target):
+        session = Session.object_session(target)
+        if session is None:
+            return
+        session.info.setdefault(PENDING_KEY, {})[target.id] = ('remove',)
+
+    def _on_commit(self, session):
+        deltas = session.info.pop(PENDING_KEY, None)
+        if not deltas:
+            return
+        for doc_id, delta in deltas.items():
+            if delta[0] == 'upsert':
+                self.upsert(doc_id, *delta[1:])
+            else:
+                self.remove(doc_id)
+        self._notify(list(deltas))
+
+    def _on_rollback(self, session, previous_transaction):
+        session.info.pop(PENDING_KEY, None)
+
+    # ------------------------------------------------------------------
+    # Reconciliation
+    # ------------------------------------------------------------------
+
+    def reconcile(self) -> int:
+        """
+        Converge with the DB without a full rebuild (requires app context).
+        Compares (id, updated_at) of every active document with the indexed
+        versions, so changes made by other workers or outside the ORM are
+        picked up whatever order they were committed in; changed documents
+        are re-chunked from their current content.
+
+        Returns:
+            Number of documents changed in the index
+        """
+        with self._lock:
+            indexed = dict(self.versions)
+
+        active_ids = set()
+        stale = []
+        for doc_id, updated_at in db.session.query(
+            DocumentModel.id, DocumentModel.updated_at
+        ).filter(DocumentModel.active.is_(True)).yield_per(1000):
+            active_ids.add(doc_id)
+            if doc_id not in indexed or indexed[doc_id] != updated_at:
+                stale.append(doc_id)
+
+        # Deleted or deactivated documents
+        removed = list(set(indexed) - active_ids)
+        for doc_id in removed:
+            self.remove(doc_id)
+
+        changed_docs = {}
+        if stale:
+            for doc_id, title, updated_at in db.session.query(
+                DocumentModel.id, DocumentModel.title, DocumentModel.updated_at
+            ).filter(DocumentModel.id.in_(stale)):
+                changed_docs[doc_id] = (title, updated_at)
+            passages = self._rechunk(list(changed_docs))
+            for doc_id, (title, updated_at) in changed_docs.items():
+                self.upsert(doc_id, title, passages.get(doc_id, []), updated_at)
+
+        changed = len(changed_docs) + len(removed)
+        if changed:
+            self._notify(list(changed_docs) + removed)
+            print(f"Index reconciliation applied {changed} changes")
+        return changed
+
+    def start_reconciler(self, app, interval: int):
+        """Run reconcile() every interval seconds in a daemon thread"""
+        if self._reconciler is not None or interval <= 0:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                if not self.ready:
+                    continue
+                try:
+                    with app.app_context():
+                        self.reconcile()
+                        db.session.remove()
+                except Exception as e:
+                    print(f"Error reconciling document index: {e}")
+
+        self._reconciler = threading.Thread(target=loop, name='index-reconciler', daemon=True)
+        self._reconciler.start()
@@ -0,0 +1,92 @@
+"""
+Language Detector - Fast, deterministic detection for fr/ar/am/en
+Classifies by Unicode script first; only Latin-script text that the
+stopword heuristic cannot settle falls back to a cached n-gram model
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+import langdetect
+from langdetect import DetectorFactory
+
+# langdetect is random unless seeded
+DetectorFactory.seed = 0
+
+ARABIC_RANGES = (
+    (0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF),
+    (0xFB50, 0xFDFF), (0xFE70, 0xFEFF)
+)
+TIFINAGH_RANGE = (0x2D30, 0x2D7F)
+
+LATIN_WORD = re.compile(r"[a-zà-öø-ÿœæ]+")
+FRENCH_ACCENTS = set('éèêëàâçùûüôîïœ')
+
+FRENCH_WORDS = {
+    'le', 'la', 'les', 'un', 'une', 'des', 'du', 'de', 'et', 'est', 'pour', 'dans', 'avec',
+    'que', 'qui', 'comment', 'je', 'vous', 'nous', 'mon', 'ma', 'mes', 'votre', 'pas', 'sur',
+    'quel', 'quelle', 'quels', 'combien', 'faire', 'obtenir', 'carte', 'demande', 'au', 'aux',
+    'ce', 'cette', 'il', 'elle', 'ou', 'où', 'bonjour', 'merci', 'veux', 'dois', 'peut'
+}
+ENGLISH_WORDS = {
+    'the', 'an', 'and', 'is', 'are', 'for', 'in', 'with', 'that', 'who', 'how', 'what',
+    'i', 'you', 'we', 'my', 'your', 'not', 'on', 'which', 'much', 'many', 'do', 'does', 'get',
+    'card', 'request', 'to', 'of', 'it', 'this', 'can', 'where', 'hello', 'thanks', 'want', 'need'
+}
+
+SUPPORTED = ('fr', 'ar', 'am', 'en')
+
+
+def _in_ranges(code_point, ranges):
+    return any(low <= code_point <= high for low, high in ranges)
+
+
+def detect_language(text: str, default: str = 'fr') -> str:
+    """Return one of fr, ar, am, en for the text"""
+    if not text:
+        return default
+
+    arabic = tifinagh = latin = 0
+    for ch in text:
+        if not ch.isalpha():
+            continue
+        code_point = ord(ch)
+        if _in_ranges(code_point, ARABIC_RANGES):
+            arabic += 1
+        elif TIFINAGH_RANGE[0] <= code_point <= TIFINAGH_RANGE[1]:
+            tifinagh += 1
+        elif unicodedata.name(ch, '').startswith('LATIN'):
+            latin += 1
+
+    if not (arabic or tifinagh or latin):
+        return default
+    if tifinagh >= arabic and tifinagh >= latin:
+        return 'am'
+    if arabic >= latin:
+        return 'ar'
+    return _detect_latin(text.lower(), default)
+
+
+def _detect_latin(text, default):
+    words = LATIN_WORD.findall(text)
+    french = sum(1 for word in words if word in FRENCH_WORDS)
+    english = sum(1 for word in words if word in ENGLISH_WORDS)
+    french += sum(1 for ch in text if ch in FRENCH_ACCENTS)
+
+    if french > english:
+        return 'fr'
+    if english > french:
+        return 'en'
+    return _ngram_detect(text[:500], default)
+
+
+@lru_cache(maxsize=4096)
+def _ngram_detect(text, default):
+    """langdetect's n-gram profiles, restricted to the Latin-script languages we support"""
+    try:
+        for guess in langdetect.detect_langs(text):
+            if guess.lang in ('fr', 'en'):
+                return guess.lang
+    except Exception:
+        pass
+    return default
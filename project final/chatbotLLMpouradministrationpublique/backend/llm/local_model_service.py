@@ -2,13 +2,24 @@
 Intelligent Local Model Service - Moroccan Administrative Assistance
 Uses Ollama for natural, ChatGPT-like conversations
 """
-from llm.ollama_service import OllamaService
-from typing import List, Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from llm.ollama_pool import OllamaPool
+from llm.model_router import ModelRouter
+from llm.cancellation import CancellationToken, RequestCancelled
+from llm.generation_limiter import OllamaOverloadedError
+from llm.prompt_builder import PromptBuilder
+from typing import List, Dict, Iterator, Optional, Union
+
+# Longest answer requested from the model, in tokens
+ANSWER_MAX_TOKENS = 1500
 
 class LocalModelService:
     def __init__(self):
         print("Initializing Intelligent Moroccan Admin Assistant...")
-        self.ollama = OllamaService()
+        self.ollama = OllamaPool()
         
         # Preferred model priority (will use first available)
         self.model_priority = [
@@ -18,6 +29,27 @@ class LocalModelService:
             "mistral:7b"
         ]
         
+        # Languages each model family answers well in without going through French
+        self.model_languages = {
+            "aya-expanse": ("fr", "ar", "en"),
+            "command-r": ("fr", "ar", "en"),
+            "qwen2.5": ("fr", "ar", "en"),
+            "mistral": ("fr", "en"),
+            "llama3.2": ("fr", "en"),
+            "phi3": ("en",)
+        }
+        
+        # Small models for simple questions (exact names only, never the selected model)
+        self.small_model_priority = [model.strip() for model in Config.SMALL_MODEL_PRIORITY if model.strip()]
+        self.router = ModelRouter(
+            latency_budget=Config.MODEL_LATENCY_BUDGET,
+            long_question_words=Config.ROUTER_LONG_QUESTION_WORDS,
+            min_confidence=Config.ROUTER_MIN_CONFIDENCE,
+            deep_conversation=Config.ROUTER_DEEP_CONVERSATION,
+            latency_window=Config.ROUTER_LATENCY_WINDOW,
+            probe_every=Config.ROUTER_PROBE_EVERY
+        )
+        
         # System prompt with Moroccan administrative knowledge
         self.system_prompt = """Tu es un assistant expert en administration publique marocaine. Tu aides les citoyens à comprendre les démarches administratives au Maroc.
 
@@ -111,19 +143,85 @@ STYLE DE RÉPONSE:
 - نظّم إجاباتك بوضوح
 - كن متعاطفاً وصبوراً"""
 
-        self.selected_model = self._select_best_model()
-        if not self.selected_model:
-            print("WARNING: No Ollama models found. Please install models.")
-        else:
-            print(f"✓ Using model: {self.selected_model}")
+        # History is every message not yet in the summary: its start only moves when
+        # the summarizer folds a batch in, so the prompt prefix stays byte-stable.
+        # Passages and history are trimmed to the token budget
+        self.prompt_builder = PromptBuilder(Config.PROMPT_TOKEN_BUDGET)
+        self.last_prompt_report = None
+        
+        # Context mode: /api/generate context tokens per conversation (LRU)
+        self.context_mode = Config.OLLAMA_CONTEXT_MODE
+        self._contexts: "OrderedDict[int, Dict]" = OrderedDict()
+        self._contexts_lock = threading.Lock()
+        
+        # Model discovery is lazy: nothing here talks to Ollama
+        self._selected_model = None
+        self._small_model = None
+        self._discovered = False
+        self._discovery_lock = threading.RLock()
+        self._discovery_thread = None
     
-    def _select_best_model(self) -> Optional[str]:
-        """Select the best available model from priority list"""
-        if not self.ollama.check_ollama_running():
-            print("WARNING: Ollama service not running!")
-            return None
+    @property
+    def selected_model(self) -> Optional[str]:
+        """Best available model; discovered on first use, then kept fresh in the background"""
+        self._ensure_discovered()
+        return self._selected_model
+    
+    @property
+    def small_model(self) -> Optional[str]:
+        """Small model for simple questions, None when routing is off or none is installed"""
+        self._ensure_discovered()
+        return self._small_model
+    
+    def _ensure_discovered(self):
+        # Concurrent first requests wait for the first discovery instead of seeing no model yet
+        if not self._discovered:
+            with self._discovery_lock:
+                if not self._discovered:
+                    self.refresh_model()
+                    self._discovered = True
+    
+    def refresh_model(self) -> Optional[str]:
+        """Ask Ollama which models are installed and switch to the best one by model_priority"""
+        with self._discovery_lock:
+            if not self.ollama.check_ollama_running():
+                if self._selected_model is None:
+                    print("WARNING: Ollama service not running!")
+                return self._selected_model
+            
+            available = self.ollama.list_models()
+            best = self._select_best_model(available)
+            if best != self._selected_model:
+                if best:
+                    print(f"✓ Using model: {best}" + (f" (was {self._selected_model})" if self._selected_model else ""))
+                else:
+                    print("WARNING: No Ollama models found. Please install models.")
+                self._selected_model = best
+            
+            small = self._select_small_model(available, best) if Config.MODEL_ROUTER_ENABLED else None
+            if small != self._small_model:
+                print(f"✓ Small model for simple questions: {small}" if small else "No small model: every question uses the main model")
+                self._small_model = small
+            return self._selected_model
+    
+    def start_model_discovery(self, interval: int):
+        """Refresh the selected model every interval seconds in a daemon thread"""
+        if self._discovery_thread is not None or interval <= 0:
+            return
+        
+        def loop():
+            while True:
+                try:
+                    self.refresh_model()
+                except Exception as e:
+                    print(f"Error discovering Ollama models: {e}")
+                time.sleep(interval)
         
-        available = self.ollama.list_models()
+        self._discovery_thread = threading.Thread(target=loop, name='ollama-model-discovery', daemon=True)
+        self._discovery_thread.start()
+    
+    def _select_best_model(self, available: List[str]) -> Optional[str]:
+        """Select the best available model from priority list"""
         for model in self.model_priority:
             # Check exact match orpartial match
             for avail in available:
@@ -137,74 +235,335 @@ STYLE DE RÉPONSE:
         
         return None
     
-    def generate_response(self, context: str, question: str, language: str = 'fr', conversation_history: List[Dict] = None) -> str:
+    def _select_small_model(self, available: List[str], main_model: Optional[str]) -> Optional[str]:
+        """First installed model of small_model_priority that is not the main model"""
+        for model in self.small_model_priority:
+            for avail in available:
+                if model in avail and avail != main_model:
+                    return avail
+        return None
+    
+    def speaks(self, model: Optional[str], language: str) -> bool:
+        """True if the model is known to answer well in language"""
+        if not model:
+            return False
+        return language in self.model_languages.get(model.split(':')[0], ("fr",))
+    
+    def answers_natively(self, language: str) -> bool:
+        """True if questions in language can skip the translation round trip"""
+        return language in Config.DIRECT_LANGUAGES and self.speaks(self.selected_model, language)
+    
+    def route(self, question: str, retrieval_confidence: float = None, conversation_history: List[Dict] = None,
+              conversation_summary: str = None, language: str = 'fr') -> Optional[str]:
+        """Pick the small or the main model for this question"""
+        # A small model that is weak in the answer language is never picked
+        small_model = self.small_model if self.speaks(self.small_model, language) else None
+        model, reason = self.router.choose(
+            small_model,
+            self.selected_model,
+            question,
+            retrieval_confidence=retrieval_confidence,
+            depth=len(conversation_history or []),
+            has_summary=bool(conversation_summary)
+        )
+        if model and self._small_model:
+            print(f"Routed to {model} ({reason})")
+        return model
+    
+    def model_signature(self) -> str:
+        """Models an answer may come from, for cache keys"""
+        return f"{self.selected_model or ''}|{self.small_model or ''}"
+    
+    def _system_prompt(self, language: str) -> str:
+        if language == 'ar':
+            return self.system_prompt_ar
+        if language == 'en':
+            return self.system_prompt + "\n- Réponds toujours en anglais, la langue de l'utilisateur"
+        return self.system_prompt
+    
+    def _enhance_prompt(self, context: str, question: str, language: str = 'fr') -> str:
+        """Question with the retrieved context (only ever sent as the last message)"""
+        if context and len(context.strip()) > 50 and language == 'ar':
+            return f"""سياق مفيد من قاعدة المعرفة:
+{context}
+
+سؤال المستخدم: {question}
+
+أجب بالعربية بشكل طبيعي وحواري مستعيناً بالمعلومات أعلاه وبمعرفتك بالإدارة المغربية."""
+        if context and len(context.strip()) > 50 and language == 'en':
+            return f"""Relevant context from the knowledge base:
+{context}
+
+User's question: {question}
+
+Answer in English, naturally and conversationally, using the information above and your knowledge of Moroccan administration. The context may be in French: answer in English anyway."""
+        if context and len(context.strip()) > 50:
+            return f"""Contexte pertinent de la base de connaissances:
+{context}
+
+Question de l'utilisateur: {question}
+
+Réponds de manière naturelle et conversationnelle en utilisant les informations ci-dessus et tes connaissances sur l'administration marocaine."""
+        return question
+    
+    def _plan_prompt(self, model: str, context: Union[str, List[str]], question: str, language: str,
+                     conversation_history: List[Dict], conversation_summary: str = None) -> Dict:
+        """Fit system prompt, passages (best first) and recent turns into the token budget"""
+        passages = [context] if isinstance(context, str) else list(context or [])
+        plan = self.prompt_builder.build(
+            model,
+            self._system_prompt(language),
+            [passage for passage in passages if passage],
+            conversation_history or [],
+            lambda joined_context: self._enhance_prompt(joined_context, question, language),
+            summary=self._summary_message(conversation_summary)
+        )
+        
+        report = plan['report']
+        self.last_prompt_report = report
+        print(f"Prompt tokens ({report['method']}): system={report['system']} summary={report['summary']} "
+              f"passages={report['passages']} ({report['passages_used']} used, {report['passages_dropped']} dropped) "
+              f"history={report['history']} ({report['history_used']} used, {report['history_dropped']} dropped) "
+              f"question={report['question']} total={report['total']}/{report['budget']}")
+        return plan
+    
+    def _summary_message(self, conversation_summary: str) -> Optional[str]:
+        if not conversation_summary:
+            return None
+        return f"Résumé de la conversation précédente:\n{conversation_summary}"
+    
+    def _build_messages(self, model: str, context: Union[str, List[str]], question: str, language: str = 'fr',
+                        conversation_history: List[Dict] = None, conversation_summary: str = None) -> List[Dict]:
+        """Build the chat messages (system prompt, summary, history, question with context)"""
+        plan = self._plan_prompt(model, context, question, language, conversation_history, conversation_summary)
+        
+        # Stable prefix: system prompt, summary and past messages exactly as stored
+        messages = [{"role": "system", "content": self._system_prompt(language)}]
+        if conversation_summary:
+            messages.append({"role": "system", "content": self._summary_message(conversation_summary)})
+        for msg in plan['history']:
+            messages.append({
+                "role": msg.get("role", "user"),
+                "content": msg.get("content", "")
+            })
+        
+        # The retrieved context changes every turn, so it goes last
+        messages.append({"role": "user", "content": plan['question']})
+        return messages
+    
+    def _generate_with_context(self, model: str, context: Union[str, List[str]], question: str, language: str,
+                               conversation_history: List[Dict], conversation_id: int,
+                               conversation_summary: str = None, cancel: CancellationToken = None) -> Iterator[str]:
+        """
+        Context mode: continue the conversation from the token array Ollama
+        returned last turn, sending only the new question.
+        
+        Falls back to replaying the windowed history as text when there is no
+        stored context, or it belongs to another model/language, is out of step
+        with the stored history, has grown past OLLAMA_CONTEXT_MAX_TOKENS, or
+        would not leave room in OLLAMA_NUM_CTX for the new prompt and answer
+        (Ollama would silently shift out the start, system prompt included).
+        """
+        history = conversation_history or []
+        plan = self._plan_prompt(model, context, question, language, history, conversation_summary)
+        prompt = plan['question']
+        prompt_tokens = plan['report']['question'] + plan['report']['passages']
+        with self._contexts_lock:
+            state = self._contexts.get(conversation_id)
+        
+        if (state and state['model'] == model and state['language'] == language
+                and state['turns'] == len(history) and len(state['context']) <= Config.OLLAMA_CONTEXT_MAX_TOKENS
+                and len(state['context']) + prompt_tokens + ANSWER_MAX_TOKENS <= Config.OLLAMA_NUM_CTX):
+            system, tokens = None, state['context']
+        else:
+            system, tokens = self._system_prompt(language), None
+            turns = [
+                f"{'Utilisateur' if msg.get('role') == 'user' else 'Assistant'}: {msg.get('content', '')}"
+                for msg in plan['history']
+            ]
+            if conversation_summary:
+                turns.insert(0, self._summary_message(conversation_summary))
+            prompt = "\n\n".join(turns + [prompt])
+        
+        def remember(final_chunk):
+            if not final_chunk.get('context'):
+                return
+            with self._contexts_lock:
+                self._contexts[conversation_id] = {
+                    'model': model,
+                    'language': language,
+                    'turns': len(history) + 2,  # this question and its answer
+                    'context': final_chunk['context']
+                }
+                self._contexts.move_to_end(conversation_id)
+                while len(self._contexts) > Config.OLLAMA_CONTEXT_CONVERSATIONS:
+                    self._contexts.popitem(last=False)
+        
+        yield from self.ollama.generate_stream(
+            model=model,
+            prompt=prompt,
+            system=system,
+            context=tokens,
+            temperature=0.7,
+            max_tokens=ANSWER_MAX_TOKENS,
+            on_done=remember,
+            cancel=cancel
+        )
+    
+    def generate_response(self, context: Union[str, List[str]], question: str, language: str = 'fr', conversation_history: List[Dict] = None,
+                          conversation_id: int = None, conversation_summary: str = None,
+                          retrieval_confidence: float = None, cancel: CancellationToken = None) -> str:
         """
         Generate intelligent response using Ollama LLM.
         
         Args:
-            context: Retrieved relevant documents (from RAG)
-            question: User's question
-            language: Response language
+            context: Retrieved passages, best first (from RAG), or one context string
+            question: User's question (in language)
+            language: Response language; the prompts follow it
             conversation_history: Previous messages for context
+            conversation_id: Enables context-token reuse when context mode is on
+            conversation_summary: Summary of turns older than conversation_history
+            retrieval_confidence: How well the top passage covers the question (for model routing)
+            cancel: Stops the generation; the partial answer is returned
         
         Returns:
             Intelligent, conversational response
         """
-        if not self.selected_model:
+        model = self.route(question, retrieval_confidence, conversation_history, conversation_summary, language)
+        if not model:
             return self._fallback_response(question, language)
         
-        # Select system prompt based on language
-        if language == 'ar':
-            system = self.system_prompt_ar
-        else:
-            system = self.system_prompt
-        
-        # Build enhanced prompt with context
-        if context and len(context.strip()) > 50:
-            enhanced_prompt = f"""Contexte pertinent de la base de connaissances:
-{context}
-
-Question de l'utilisateur: {question}
-
-Réponds de manière naturelle et conversationnelle en utilisant les informations ci-dessus et tes connaissances sur l'administration marocaine."""
-        else:
-            enhanced_prompt = question
-        
-        # Build conversation messages for chat API
-        messages = [{"role": "system", "content": system}]
-        
-        # Add conversation history if provided
-        if conversation_history:
-            for msg in conversation_history[-6:]:  # Last 6 messages for context
-                messages.append({
-                    "role": msg.get("role", "user"),
-                    "content": msg.get("content", "")
-                })
+        start_time = time.perf_counter()
+        if self.context_mode and conversation_id is not None:
+            response = "".join(self._generate_with_context(
+                model, context, question, language, conversation_history, conversation_id, conversation_summary, cancel
+            )).strip()
+            if cancel is not None and cancel.cancelled:
+                return response
+            if response:
+                self.router.record(model, time.perf_counter() - start_time)
+            return response or self._fallback_response(question, language)
         
-        # Add current question
-        messages.append({"role": "user", "content": enhanced_prompt})
+        messages = self._build_messages(model, context, question, language, conversation_history, conversation_summary)
         
         try:
             # Use chat API for conversational context
-            response = self.ollama.chat(
-                model=self.selected_model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1500
-            )
+            if cancel is not None:
+                # Streamed, so cancelling can close the connection mid-answer
+                response = "".join(self.ollama.chat_stream(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=ANSWER_MAX_TOKENS,
+                    cancel=cancel
+                )).strip()  # same text as the streaming path stores
+                if cancel.cancelled:
+                    return response
+            else:
+                response = self.ollama.chat(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=ANSWER_MAX_TOKENS
+                )
             
             if response:
+                self.router.record(model, time.perf_counter() - start_time)
                 return response
             else:
                 return self._fallback_response(question, language)
                 
+        except (OllamaOverloadedError, RequestCancelled):
+            raise
         except Exception as e:
             print(f"Error generating response: {e}")
             return self._fallback_response(question, language)
     
+    def generate_response_stream(self, context: Union[str, List[str]], question: str, language: str = 'fr', conversation_history: List[Dict] = None,
+                                 conversation_id: int = None, conversation_summary: str = None,
+                                 retrieval_confidence: float = None, cancel: CancellationToken = None) -> Iterator[str]:
+        """Same as generate_response, but yields the answer token by token"""
+        model = self.route(question, retrieval_confidence, conversation_history, conversation_summary, language)
+        if not model:
+            yield self._fallback_response(question, language)
+            return
+        
+        if self.context_mode and conversation_id is not None:
+            tokens = self._generate_with_context(
+                model, context, question, language, conversation_history, conversation_id, conversation_summary, cancel
+            )
+        else:
+            tokens = self.ollama.chat_stream(
+                model=model,
+                messages=self._build_messages(model, context, question, language, conversation_history, conversation_summary),
+                temperature=0.7,
+                max_tokens=ANSWER_MAX_TOKENS,
+                cancel=cancel
+            )
+        
+        # Only time spent waiting on Ollama counts: the caller's back-translation and
+        # writes to the client happen between tokens and are not model latency
+        produced = False
+        generation_time = 0.0
+        try:
+            tokens = iter(tokens)
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    token = next(tokens)
+                finally:
+                    generation_time += time.perf_counter() - start_time
+                produced = True
+                yield token
+        except StopIteration:
+            pass
+        except (OllamaOverloadedError, RequestCancelled):
+            raise
+        except Exception as e:
+            print(f"Error generating response: {e}")
+        
+        if cancel is not None and cancel.cancelled:
+            return  # a partial answer, not a latency sample nor a reason for the fallback text
+        if produced:
+            self.router.record(model, generation_time)
+        else:
+            yield self._fallback_response(question, language)
+    
+    def summarize(self, previous_summary: Optional[str], messages: List[Dict]) -> Optional[str]:
+        """Fold messages into the previous summary; None if the model is unavailable"""
+        model = self.selected_model
+        if not model:
+            return None
+        
+        transcript = "\n".join(
+            f"{'Utilisateur' if msg.get('role') == 'user' else 'Assistant'}: {msg.get('content', '')}"
+            for msg in messages
+        )
+        prompt = f"""Résumé actuel:
+{previous_summary or '(aucun)'}
+
+Nouveaux échanges:
+{transcript}
+
+Mets à jour le résumé en français, en quelques phrases. Garde les démarches demandées, la situation du citoyen, les documents et montants mentionnés et les questions encore ouvertes."""
+        
+        return self.ollama.generate(
+            model=model,
+            prompt=prompt,
+            system="Tu résumes des conversations entre un citoyen et un assistant administratif marocain.",
+            temperature=0.2,
+            max_tokens=Config.SUMMARY_MAX_TOKENS
+        )
+    
+    def is_fallback_response(self, text: str) -> bool:
+        """True if text is the canned unavailability message rather than a generated answer"""
+        return text in (self._fallback_response('', 'fr'), self._fallback_response('', 'ar'), self._fallback_response('', 'en'))
+    
     def _fallback_response(self, question: str, language: str = 'fr') -> str:
         """Fallback response when LLM is unavailable"""
         if language == 'ar':
             return """عذراً، النظام غير متاح حالياً. يرجى المحاولة لاحقاً أو الاتصال بالإدارة المحلية للحصول على المساعدة."""
+        elif language == 'en':
+            return """Sorry, the system is temporarily unavailable. Please try again later or contact your local administration for assistance."""
         else:
             return """Je m'excuse, le système est temporairement indisponible. Veuillez réessayer plus tard ou contacter votre administration locale pour assistance."""
@@ -0,0 +1,126 @@
+"""
+Model Registry - Memory-budgeted LRU of loaded translation models
+Remembers failed loads for a while so callers do not retry a slow from_pretrained on every request
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import torch
+
+# (tokenizer, model) pair as returned by the loader
+ModelEntry = Tuple[Any, Any]
+
+
+def model_memory_bytes(model) -> int:
+    """Resident size of a model's weights and buffers (handles quantized packed params)"""
+    def size_of(value):
+        if torch.is_tensor(value):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(size_of(item) for item in value)
+        return 0
+
+    return sum(size_of(value) for value in model.state_dict().values())
+
+
+class TranslationModelRegistry:
+    def __init__(self, loader: Callable[[str], ModelEntry], budget_mb: int = 2048, failure_ttl: int = 600):
+        """
+        Initialize the registry.
+
+        Args:
+            loader: Loads (tokenizer, model) for a model name; may raise
+            budget_mb: RAM budget for all loaded models together
+            failure_ttl: Seconds a failed load is remembered before it is retried
+        """
+        self.loader = loader
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self.failure_ttl = failure_ttl
+
+        self._loaded: "OrderedDict[str, Tuple[ModelEntry, int]]" = OrderedDict()
+        self._failures: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.evictions = 0
+
+    def get(self, key: str, model_name: str) -> Optional[ModelEntry]:
+        """Return (tokenizer, model) for a language pair, loading it if needed; None if unavailable"""
+        entry = self._lookup(key)
+        if entry is not None or self._recently_failed(key):
+            return entry
+
+        # One thread loads a given pair; the others wait for its result
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            entry = self._lookup(key)
+            if entry is not None or self._recently_failed(key):
+                return entry
+
+            try:
+                print(f"Loading translation model: {model_name}...")
+                entry = self.loader(model_name)
+            except Exception as e:
+                print(f"Error loading model {model_name}: {e}")
+                with self._lock:
+                    self._failures[key] = (time.monotonic(), str(e))
+                return None
+
+            size = model_memory_bytes(entry[1])
+            with self._lock:
+                self._failures.pop(key, None)
+                self._loaded[key] = (entry, size)
+                self._evict(keep=key)
+            print(f"✓ Loaded {model_name} ({size / 1024 / 1024:.0f} MB)")
+            return entry
+
+    def _lookup(self, key):
+        with self._lock:
+            item = self._loaded.get(key)
+            if item is None:
+                return None
+            self._loaded.move_to_end(key)
+            return item[0]
+
+    def _recently_failed(self, key):
+        with self._lock:
+            failure = self._failures.get(key)
+            if failure is None:
+                return False
+            if time.monotonic() - failure[0] > self.failure_ttl:
+                del self._failures[key]
+                return False
+            return True
+
+    def _evict(self, keep):
+        # Drop least recently used pairs until the budget is met (never the model just loaded)
+        while self.memory_bytes() > self.budget_bytes and len(self._loaded) > 1:
+            victim = next(iter(self._loaded))
+            if victim == keep:
+                self._loaded.move_to_end(victim)
+                victim = next(iter(self._loaded))
+            self._loaded.pop(victim)
+            self.evictions += 1
+            print(f"Evicted translation model {victim} (memory budget)")
+
+    def memory_bytes(self) -> int:
+        """Total resident size of loaded models"""
+        return sum(size for _, size in self._loaded.values())
+
+    def stats(self) -> Dict:
+        """Loaded pairs, their sizes and the pairs unavailable after a recent failed load"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'loaded': {key: size for key, (_, size) in self._loaded.items()},
+                'memory_bytes': self.memory_bytes(),
+                'budget_bytes': self.budget_bytes,
+                'unavailable': {
+                    key: {'error': error, 'retry_in': round(self.failure_ttl - (now - failed_at))}
+                    for key, (failed_at, error) in self._failures.items()
+                    if now - failed_at <= self.failure_ttl
+                },
+                'evictions': self.evictions
+            }
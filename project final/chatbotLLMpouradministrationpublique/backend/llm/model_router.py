@@ -0,0 +1,174 @@
+"""
+Model Router - Send each question to the small or the large local model
+Cheap features (question length, retrieval confidence, conversation depth)
+decide how hard a question is; per-model latency histograms over a recent
+window keep the large model within the latency budget
+"""
+import bisect
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds of the latency buckets, in seconds (the last bucket is open-ended)
+LATENCY_BUCKETS = [0.5, 1, 2, 4, 8, 16, 32, 64, 128]
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: List[float] = None, window: float = 600, max_samples: int = 200):
+        """Histogram of the samples seen in the last window seconds (at most max_samples)"""
+        self.buckets = buckets or LATENCY_BUCKETS
+        self.window = window
+        self.samples = deque(maxlen=max_samples)  # (observed_at, bucket index, seconds)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self._expire()
+        if len(self.samples) == self.samples.maxlen:
+            self._forget(self.samples.popleft())
+        index = bisect.bisect_left(self.buckets, seconds)
+        self.samples.append((time.monotonic(), index, seconds))
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += seconds
+
+    def _expire(self):
+        # Old samples (a cold model load, a busy hour) stop counting once they leave the window
+        cutoff = time.monotonic() - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self._forget(self.samples.popleft())
+
+    def _forget(self, sample):
+        _, index, seconds = sample
+        self.counts[index] -= 1
+        self.total -= 1
+        self.sum -= seconds
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given fraction of observations (None if empty)"""
+        self._expire()
+        if not self.total:
+            return None
+        wanted = fraction * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def stats(self) -> Dict:
+        self._expire()
+        labels = [f"<={bound}s" for bound in self.buckets] + [f">{self.buckets[-1]}s"]
+        return {
+            'window': self.window,
+            'count': self.total,
+            'mean': self.sum / self.total if self.total else None,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class ModelRouter:
+    def __init__(self, latency_budget: float = 20, long_question_words: int = 25,
+                 min_confidence: float = 0.5, deep_conversation: int = 6,
+                 latency_window: float = 600, probe_every: int = 10):
+        """
+        Initialize the router.
+
+        Args:
+            latency_budget: Seconds a generation should take at p90
+            long_question_words: Questions this long count as complex
+            min_confidence: Below this share of question terms found in the top passage, retrieval is weak
+            deep_conversation: Past messages from which a conversation counts as deep
+            latency_window: Seconds of latency samples the p90 is computed over
+            probe_every: While downgrading, every Nth complex question still goes to the
+                large model so its latency keeps being measured (0 disables)
+        """
+        self.latency_budget = latency_budget
+        self.long_question_words = long_question_words
+        self.min_confidence = min_confidence
+        self.deep_conversation = deep_conversation
+        self.latency_window = latency_window
+        self.probe_every = probe_every
+
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.decisions = {'small': 0, 'large': 0, 'downgraded': 0, 'probe': 0}
+        self._downgraded_in_a_row = 0
+        self._lock = threading.Lock()
+
+    def complexity(self, question: str, retrieval_confidence: Optional[float], depth: int,
+                   has_summary: bool) -> List[str]:
+        """Reasons the question needs the large model (empty for simple questions)"""
+        reasons = []
+        if len(question.split()) >= self.long_question_words:
+            reasons.append('long question')
+        if retrieval_confidence is not None and retrieval_confidence < self.min_confidence:
+            reasons.append('weak retrieval')
+        if depth >= self.deep_conversation or has_summary:
+            reasons.append('deep conversation')
+        return reasons
+
+    def choose(self, small_model: Optional[str], large_model: Optional[str], question: str,
+               retrieval_confidence: Optional[float] = None, depth: int = 0,
+               has_summary: bool = False) -> Tuple[Optional[str], str]:
+        """Return (model, reason) for the question"""
+        if not small_model or small_model == large_model:
+            return large_model, 'single model'
+        if not large_model:
+            return small_model, 'single model'
+
+        reasons = self.complexity(question, retrieval_confidence, depth, has_summary)
+        if not reasons:
+            self._count('small')
+            return small_model, 'simple question'
+
+        # Complex, but the large model is too slow right now while the small one keeps up
+        large_p90 = self.p90(large_model)
+        small_p90 = self.p90(small_model)
+        if large_p90 is not None and large_p90 > self.latency_budget and (small_p90 is None or small_p90 <= self.latency_budget):
+            with self._lock:
+                self._downgraded_in_a_row += 1
+                probe = self.probe_every and self._downgraded_in_a_row >= self.probe_every
+                if probe:
+                    self._downgraded_in_a_row = 0
+            if probe:
+                self._count('probe')
+                return large_model, f"latency probe ({', '.join(reasons)})"
+            self._count('downgraded')
+            return small_model, f"large model over latency budget (p90 {large_p90}s > {self.latency_budget}s)"
+
+        with self._lock:
+            self._downgraded_in_a_row = 0
+        self._count('large')
+        return large_model, ', '.join(reasons)
+
+    def record(self, model: str, seconds: float):
+        """Add a generation latency to the model's histogram"""
+        with self._lock:
+            histogram = self.histograms.get(model)
+            if histogram is None:
+                histogram = self.histograms[model] = LatencyHistogram(window=self.latency_window)
+            histogram.observe(seconds)
+
+    def p90(self, model: str) -> Optional[float]:
+        with self._lock:
+            histogram = self.histograms.get(model)
+            return histogram.percentile(0.9) if histogram else None
+
+    def _count(self, decision):
+        with self._lock:
+            self.decisions[decision] += 1
+
+    def stats(self) -> Dict:
+        """Routing decisions and per-model latency histograms"""
+        with self._lock:
+            return {
+                'latency_budget': self.latency_budget,
+                'latency_window': self.latency_window,
+                'decisions': dict(self.decisions),
+                'latency': {model: histogram.stats() for model, histogram in self.histograms.items()}
+            }
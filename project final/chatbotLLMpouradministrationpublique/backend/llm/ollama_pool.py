@@ -0,0 +1,173 @@
+"""
+Ollama Pool - Spread generation over several Ollama servers
+Each backend keeps its own health probe, circuit breaker and generation slots;
+requests go to the least-loaded healthy backend with a free slot, preferring
+one that already has the model in memory, and fail over to the next one
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from config import Config
+from llm.cancellation import CancellationToken
+from llm.circuit_breaker import OPEN
+from llm.generation_limiter import FULL, GenerationLimiter
+from llm.ollama_service import OllamaService
+
+
+class OllamaBackend:
+    def __init__(self, service: OllamaService):
+        """One Ollama server and its load"""
+        self.service = service
+        self.in_flight = 0
+        self.requests = 0
+
+    def usable(self) -> bool:
+        return self.service.healthy is not False and self.service.breaker.state != OPEN
+
+    def has_model(self, model: str) -> bool:
+        # Before the first probe the installed models are unknown: assume yes
+        return not self.service.available_models or model in self.service.available_models
+
+
+class OllamaPool:
+    def __init__(self, base_urls: List[str] = None):
+        """Initialize one OllamaService per endpoint (OLLAMA_BASE_URLS by default)"""
+        urls = base_urls or Config.OLLAMA_BASE_URLS
+        self.backends = [OllamaBackend(OllamaService(url)) for url in urls]
+        self.max_concurrency = Config.OLLAMA_MAX_CONCURRENCY
+        
+        # OLLAMA_MAX_CONCURRENCY generations per backend; when the usable backends are
+        # full, OLLAMA_MAX_QUEUE callers wait up to OLLAMA_QUEUE_TIMEOUT, the rest are rejected
+        self.limiter = GenerationLimiter(Config.OLLAMA_MAX_QUEUE, Config.OLLAMA_QUEUE_TIMEOUT)
+        self._lock = self.limiter.condition
+
+    def _acquire(self, model: Optional[str], exclude: Set[OllamaBackend],
+                 cancel: CancellationToken = None) -> Optional[OllamaBackend]:
+        """Pick a backend for model and take one of its slots, waiting if all are busy"""
+        return self.limiter.acquire(lambda: self._try_acquire(model, exclude), self._in_flight, cancel)
+
+    def _try_acquire(self, model, exclude):
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+
+        # Healthy backends with the model installed; if none, let the breakers answer fast
+        usable = [backend for backend in candidates if backend.usable()]
+        if model:
+            usable = [backend for backend in usable if backend.has_model(model)] or usable
+        pool = usable or candidates
+
+        # A backend at its cap takes nothing more, even when the others are down
+        free = [backend for backend in pool if backend.in_flight < self.max_concurrency]
+        if not free:
+            return FULL
+
+        backend = min(free, key=lambda b: (
+            model not in b.service.loaded_models,  # a loaded model skips the load time
+            b.in_flight,
+            b.requests
+        ))
+        backend.in_flight += 1
+        backend.requests += 1
+        return backend
+
+    def _in_flight(self) -> int:
+        return sum(backend.in_flight for backend in self.backends)
+
+    def _release(self, backend: OllamaBackend):
+        with self._lock:
+            backend.in_flight -= 1
+            self.limiter.release()
+
+    def _call(self, model: str, call: Callable[[OllamaService], Optional[str]]) -> Optional[str]:
+        tried = set()
+        while True:
+            backend = self._acquire(model, tried)
+            if backend is None:
+                return None
+            try:
+                result = call(backend.service)
+            finally:
+                self._release(backend)
+            if result is not None:
+                return result
+            tried.add(backend)
+
+    def _stream(self, model: str, open_stream: Callable[[OllamaService], Iterator[str]],
+                cancel: CancellationToken = None) -> Iterator[str]:
+        # A backend that fails before its first token is replaced by the next one (unless the turn was cancelled)
+        tried = set()
+        while True:
+            backend = self._acquire(model, tried, cancel)
+            if backend is None:
+                return
+            produced = False
+            try:
+                for token in open_stream(backend.service):
+                    produced = True
+                    yield token
+            finally:
+                self._release(backend)
+            if produced or (cancel is not None and cancel.cancelled):
+                return
+            tried.add(backend)
+
+    def check_ollama_running(self) -> bool:
+        """True if at least one backend is up"""
+        # A list, not a generator: every backend refreshes its state
+        return any([backend.service.check_ollama_running() for backend in self.backends])
+
+    def list_models(self) -> List[str]:
+        """Models installed on any backend"""
+        models = []
+        for backend in self.backends:
+            if backend.service.healthy is False:
+                continue
+            for model in backend.service.list_models():
+                if model not in models:
+                    models.append(model)
+        return models
+
+    def start_health_probe(self, interval: int):
+        """Start every backend's health probe"""
+        for backend in self.backends:
+            backend.service.start_health_probe(interval)
+
+    def generate(self, model: str, prompt: str, system: str = None, context: List[int] = None,
+                 temperature: float = 0.7, max_tokens: int = 2000) -> Optional[str]:
+        """Generate text on the best backend"""
+        return self._call(model, lambda service: service.generate(
+            model, prompt, system=system, context=context, temperature=temperature, max_tokens=max_tokens
+        ))
+
+    def generate_stream(self, model: str, prompt: str, system: str = None, context: List[int] = None,
+                        temperature: float = 0.7, max_tokens: int = 2000,
+                        on_done: Callable[[Dict], None] = None, cancel: CancellationToken = None) -> Iterator[str]:
+        """Generate text on the best backend, yielding tokens"""
+        return self._stream(model, lambda service: service.generate_stream(
+            model, prompt, system=system, context=context, temperature=temperature,
+            max_tokens=max_tokens, on_done=on_done, cancel=cancel
+        ), cancel)
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7,
+             max_tokens: int = 2000) -> Optional[str]:
+        """Chat on the best backend"""
+        return self._call(model, lambda service: service.chat(model, messages, temperature, max_tokens))
+
+    def chat_stream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7,
+                    max_tokens: int = 2000, cancel: CancellationToken = None) -> Iterator[str]:
+        """Chat on the best backend, yielding tokens"""
+        return self._stream(model, lambda service: service.chat_stream(
+            model, messages, temperature, max_tokens, cancel=cancel
+        ), cancel)
+
+    def stats(self) -> Dict:
+        """Per-backend health, breaker state and load"""
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'limiter': self.limiter.stats(),
+                'backends': [
+                    dict(backend.service.stats(), in_flight=backend.in_flight, requests=backend.requests)
+                    for backend in self.backends
+                ]
+            }
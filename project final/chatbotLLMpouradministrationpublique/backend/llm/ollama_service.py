@@ -4,30 +4,208 @@ Manages interaction with Ollama for local model inference
 """
 import requests
 import json
-from typing import Dict, List, Optional
+import socket
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
 import subprocess
 import time
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.util.retry import Retry
+from config import Config
+from llm.cancellation import CancellationToken
+from llm.circuit_breaker import CircuitBreaker
+
+_sessions: Dict[tuple, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+# A generation request made with a cancel token registers its connection's abort on it
+_cancel_context = threading.local()
+
+class AbortableHTTPConnection(HTTPConnection):
+    """HTTP connection whose socket can be shut down from the cancelling thread"""
+    def request(self, *args, **kwargs):
+        cancel = getattr(_cancel_context, 'cancel', None)
+        if cancel is not None:
+            _cancel_context.abort = self.abort
+            cancel.on_cancel(self.abort)
+        return super().request(*args, **kwargs)
+    
+    def abort(self):
+        # Unlike close(), shutdown wakes a thread blocked in recv(), even before the response headers
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+class AbortableHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = AbortableHTTPConnection
+
+class AbortableHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = dict(self.poolmanager.pool_classes_by_scheme, http=AbortableHTTPConnectionPool)
+
+def get_session(pool_size: int, max_retries: int = 0, backoff: float = 0.5) -> requests.Session:
+    """
+    Shared keep-alive session with a bounded connection pool.
+    
+    Sessions are created once per (pool_size, max_retries, backoff) and reused by
+    every thread; the underlying urllib3 pool is thread-safe and keeps one host
+    pool per Ollama backend. Retries with exponential backoff only apply to
+    idempotent methods (GET/HEAD), plus POSTs whose connection could not be
+    opened; generation uses a session without retries, so OllamaPool fails
+    over to another backend at once.
+    """
+    key = (pool_size, max_retries, backoff)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                retry = Retry(
+                    total=max_retries,
+                    connect=max_retries,
+                    read=max_retries,
+                    status=max_retries,
+                    backoff_factor=backoff,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset({"GET", "HEAD"}),
+                    raise_on_status=False
+                )
+                # One host pool per backend, or urllib3 evicts pools and loses keep-alive connections
+                hosts = max(4, len(set(Config.OLLAMA_BASE_URLS)) + 1)
+                adapter = AbortableHTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _sessions[key] = session
+    return session
 
 class OllamaService:
-    def __init__(self, base_url: str = "http://localhost:11434"):
+    def __init__(self, base_url: str = None):
         """Initialize Ollama service"""
-        self.base_url = base_url
+        self.base_url = base_url or Config.OLLAMA_BASE_URL
         self.current_model = None
         self.available_models = []
-        print(f"Initializing Ollama Service at {base_url}...")
+        self.loaded_models = set()  # models currently in memory (from /api/ps)
+        
+        # Pooled keep-alive connections; idempotent calls retry, probes and generation calls do not
+        self.session = get_session(Config.OLLAMA_POOL_SIZE, Config.OLLAMA_MAX_RETRIES, Config.OLLAMA_RETRY_BACKOFF)
+        self.probe_session = get_session(Config.OLLAMA_POOL_SIZE)
+        self.generation_session = self.probe_session
+        self.connect_timeout = Config.OLLAMA_CONNECT_TIMEOUT
+        self.read_timeout = Config.OLLAMA_READ_TIMEOUT
+        self.keep_alive = Config.OLLAMA_KEEP_ALIVE  # keeps the model (and its prompt cache) loaded between turns
+        self.num_ctx = Config.OLLAMA_NUM_CTX  # constant, since changing it makes Ollama reload the model
+        
+        # Generation calls are refused at once while Ollama is known to be down
+        self.breaker = CircuitBreaker(Config.OLLAMA_BREAKER_FAILURES, Config.OLLAMA_BREAKER_RESET, name=f'ollama {self.base_url}')
+        self.healthy = None
+        self.last_probe = None
+        self._probe_thread = None
+        print(f"Initializing Ollama Service at {self.base_url}...")
         
     def check_ollama_running(self) -> bool:
-        """Check if Ollama service is running"""
+        """Check if Ollama service is running (cached state while the health probe runs)"""
+        if self._probe_thread is not None and self.last_probe is not None:
+            return self.healthy
+        return self._probe()
+    
+    def _probe(self) -> bool:
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
+            response = self.probe_session.get(f"{self.base_url}/api/tags", timeout=(self.connect_timeout, 5))
+            healthy = response.status_code == 200
+            if healthy:
+                # The probe doubles as model discovery for routing
+                self.available_models = [model['name'] for model in response.json().get('models', [])]
+                self.loaded_models = set(self.list_running_models())
         except:
-            return False
+            healthy = False
+        
+        self.healthy = healthy
+        self.last_probe = time.monotonic()
+        # A failed probe counts like a failed call: one timeout does not open the circuit
+        if healthy:
+            self.breaker.half_open()
+        else:
+            self.breaker.record_failure()
+        return healthy
+    
+    def start_health_probe(self, interval: int):
+        """Probe Ollama every interval seconds in a daemon thread and feed the circuit breaker"""
+        if self._probe_thread is not None or interval <= 0:
+            return
+        
+        def loop():
+            while True:
+                was_healthy = self.healthy
+                if self._probe() != was_healthy:
+                    print(f"Ollama is {'up' if self.healthy else 'DOWN'} at {self.base_url}")
+                time.sleep(interval)
+        
+        self._probe_thread = threading.Thread(target=loop, name='ollama-health-probe', daemon=True)
+        self._probe_thread.start()
+    
+    def _post_generation(self, path: str, payload: Dict, stream: bool = False,
+                         cancel: CancellationToken = None) -> Optional[requests.Response]:
+        """
+        POST a generation request through the circuit breaker; None if the circuit is open.
+        
+        With cancel, cancelling shuts the connection down, and response.cancel_abort
+        is the callback to remove from cancel once the response is consumed.
+        """
+        if not self.breaker.allow_request():
+            return None
+        _cancel_context.cancel = cancel
+        _cancel_context.abort = None
+        try:
+            response = self.generation_session.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                stream=stream,
+                timeout=(self.connect_timeout, self.read_timeout)  # read timeout applies between chunks when streaming
+            )
+        except Exception:
+            if cancel is not None:
+                cancel.remove(_cancel_context.abort)
+                if cancel.cancelled:
+                    raise  # our own shutdown, not a server failure
+            self.breaker.record_failure()
+            raise
+        finally:
+            _cancel_context.cancel = None
+        
+        if cancel is not None:
+            # Connections of other schemes cannot be shut down early: close the response instead
+            response.cancel_abort = _cancel_context.abort or response.close
+            if _cancel_context.abort is None:
+                cancel.on_cancel(response.close)
+        
+        # A 4xx (e.g. unknown model) is our mistake, not an outage
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+    
+    def stats(self) -> Dict:
+        """Cached health and circuit breaker state"""
+        return {
+            'base_url': self.base_url,
+            'healthy': self.healthy,
+            'last_probe_age': time.monotonic() - self.last_probe if self.last_probe is not None else None,
+            'loaded_models': sorted(self.loaded_models),
+            'circuit': self.breaker.stats()
+        }
     
     def list_models(self) -> List[str]:
         """List all downloaded Ollama models"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=(self.connect_timeout, 10))
             if response.status_code == 200:
                 data = response.json()
                 self.available_models = [model['name'] for model in data.get('models', [])]
@@ -37,14 +215,25 @@ class OllamaService:
             print(f"Error listing models: {e}")
             return []
     
+    def list_running_models(self) -> List[str]:
+        """List models currently loaded in memory"""
+        try:
+            response = self.probe_session.get(f"{self.base_url}/api/ps", timeout=(self.connect_timeout, 5))
+            if response.status_code == 200:
+                return [model['name'] for model in response.json().get('models', [])]
+            return []
+        except Exception:
+            return []
+    
     def pull_model(self, model_name: str) -> bool:
         """Download a model from Ollama library"""
         try:
             print(f"Pulling model: {model_name}...")
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/pull",
                 json={"name": model_name},
-                stream=True
+                stream=True,
+                timeout=(self.connect_timeout, None)  # downloads can take a long time
             )
             
             for line in response.iter_lines():
@@ -63,9 +252,10 @@ class OllamaService:
     def delete_model(self, model_name: str) -> bool:
         """Delete a model"""
         try:
-            response = requests.delete(
+            response = self.session.delete(
                 f"{self.base_url}/api/delete",
-                json={"name": model_name}
+                json={"name": model_name},
+                timeout=(self.connect_timeout, 30)
             )
             return response.status_code == 200
         except Exception as e:
@@ -77,33 +267,16 @@ class OllamaService:
         model: str,
         prompt: str,
         system: str = None,
-        context: List[Dict] = None,
+        context: List[int] = None,
         temperature: float = 0.7,
         max_tokens: int = 2000
     ) -> Optional[str]:
         """Generate text using Ollama model"""
         try:
-            payload = {
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": max_tokens
-                }
-            }
-            
-            if system:
-                payload["system"] = system
-            
-            if context:
-                payload["context"] = context
-            
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=120  # 2 minutes timeout for generation
-            )
+            payload = self._generate_payload(model, prompt, system, context, temperature, max_tokens, stream=False)
+            response = self._post_generation("/api/generate", payload)
+            if response is None:
+                return None
             
             if response.status_code == 200:
                 result = response.json()
@@ -116,6 +289,58 @@ class OllamaService:
             print(f"Error generating with {model}: {e}")
             return None
     
+    def _generate_payload(self, model, prompt, system, context, temperature, max_tokens, stream):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens,
+                "num_ctx": self.num_ctx
+            }
+        }
+        
+        if system:
+            payload["system"] = system
+        
+        if context:
+            payload["context"] = context
+        return payload
+    
+    def generate_stream(
+        self,
+        model: str,
+        prompt: str,
+        system: str = None,
+        context: List[int] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        on_done: Callable[[Dict], None] = None,
+        cancel: CancellationToken = None
+    ) -> Iterator[str]:
+        """
+        Generate text, yielding tokens as they are produced.
+        
+        on_done receives the final chunk, whose 'context' token array can be
+        sent back with the next prompt so Ollama does not re-evaluate it.
+        Cancelling cancel closes the connection, which stops the generation.
+        """
+        if cancel is not None and cancel.cancelled:
+            return
+        payload = self._generate_payload(model, prompt, system, context, temperature, max_tokens, stream=True)
+        try:
+            response = self._post_generation("/api/generate", payload, stream=True, cancel=cancel)
+        except Exception as e:
+            if cancel is None or not cancel.cancelled:
+                print(f"Error generating with {model}: {e}")
+            return
+        if response is None:
+            return
+        
+        yield from self._iter_stream(response, model, lambda data: data.get('response', ''), on_done, cancel)
+    
     def chat(
         self,
         model: str,
@@ -129,17 +354,17 @@ class OllamaService:
                 "model": model,
                 "messages": messages,
                 "stream": False,
+                "keep_alive": self.keep_alive,
                 "options": {
                     "temperature": temperature,
-                    "num_predict": max_tokens
+                    "num_predict": max_tokens,
+                    "num_ctx": self.num_ctx
                 }
             }
             
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json=payload,
-                timeout=120
-            )
+            response = self._post_generation("/api/chat", payload)
+            if response is None:
+                return None
             
             if response.status_code == 200:
                 result = response.json()
@@ -152,6 +377,74 @@ class OllamaService:
             print(f"Error chatting with {model}: {e}")
             return None
     
+    def chat_stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        cancel: CancellationToken = None
+    ) -> Iterator[str]:
+        """Chat with Ollama model, yielding content tokens as they are generated"""
+        if cancel is not None and cancel.cancelled:
+            return
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens,
+                "num_ctx": self.num_ctx
+            }
+        }
+        
+        try:
+            response = self._post_generation("/api/chat", payload, stream=True, cancel=cancel)
+        except Exception as e:
+            if cancel is None or not cancel.cancelled:
+                print(f"Error chatting with {model}: {e}")
+            return
+        if response is None:
+            return
+        
+        yield from self._iter_stream(response, model, lambda data: data.get('message', {}).get('content', ''), cancel=cancel)
+    
+    def _iter_stream(self, response, model, token_of, on_done=None, cancel: CancellationToken = None) -> Iterator[str]:
+        """Yield tokens from a streamed NDJSON response and close it when done or cancelled"""
+        try:
+            if response.status_code != 200:
+                print(f"Error: {response.status_code} - {response.text}")
+                return
+            
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get('error'):
+                    print(f"Error generating with {model}: {data['error']}")
+                    return
+                token = token_of(data)
+                if cancel is not None and cancel.cancelled:
+                    return
+                if token:
+                    yield token
+                if data.get('done'):
+                    if on_done:
+                        on_done(data)
+                    return
+        except Exception as e:
+            if cancel is not None and cancel.cancelled:
+                return  # our own close, not a server failure
+            print(f"Error streaming from {model}: {e}")
+            self.breaker.record_failure()
+        finally:
+            # Closing the connection tells Ollama to stop generating
+            if cancel is not None:
+                cancel.remove(getattr(response, 'cancel_abort', None))
+            response.close()
+    
     def set_model(self, model_name: str) -> bool:
         """Set the current active model"""
         models = self.list_models()
@@ -0,0 +1,204 @@
+"""
+Prompt Builder - Token-budgeted prompt assembly for the local LLM
+Fills the budget by priority: system prompt, then retrieved passages in
+rank order, then conversation turns from newest to oldest
+"""
+import math
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Hugging Face tokenizers matching the Ollama model families we use.
+# Only loaded if already in the local cache; otherwise we estimate.
+TOKENIZER_REPOS = {
+    'qwen2.5': 'Qwen/Qwen2.5-7B-Instruct',
+    'mistral': 'mistralai/Mistral-7B-Instruct-v0.3',
+    'aya-expanse': 'CohereForAI/aya-expanse-8b',
+    'command-r': 'CohereForAI/c4ai-command-r-v01'
+}
+
+PIECE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]")
+MESSAGE_OVERHEAD = 4  # role markers and separators the chat template adds per message
+MIN_PASSAGE_TOKENS = 64  # below this a truncated passage is not worth sending
+PASSAGE_SEPARATOR = "\n---\n"
+
+
+class TokenCounter:
+    def __init__(self, model_name: Optional[str] = None):
+        """Count tokens with the model's own tokenizer when available, else estimate"""
+        self.model_name = model_name
+        self.tokenizer = self._load_tokenizer(model_name)
+        self.method = 'tokenizer' if self.tokenizer is not None else 'estimate'
+
+    @staticmethod
+    def _load_tokenizer(model_name):
+        if not model_name:
+            return None
+        repo = TOKENIZER_REPOS.get(model_name.split(':')[0])
+        if not repo:
+            return None
+        try:
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(repo, local_files_only=True)
+        except Exception:
+            return None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return self.estimate(text)
+
+    @staticmethod
+    def estimate(text: str) -> int:
+        """
+        BPE-like estimate that errs on the high side: about four characters
+        per token for Latin words, two for Arabic/Tifinagh, three per digit
+        run and one per punctuation mark
+        """
+        tokens = 0
+        for piece in PIECE.findall(text):
+            if piece[0].isdigit():
+                tokens += math.ceil(len(piece) / 3)
+            elif piece[0].isalpha():
+                per_token = 4 if ord(piece[0]) < 0x0250 else 2  # Latin vs other scripts
+                tokens += math.ceil(len(piece) / per_token)
+            else:
+                tokens += 1
+        return tokens
+
+
+class PromptBuilder:
+    def __init__(self, budget: int):
+        """Assemble prompts of at most budget tokens"""
+        self.budget = budget
+        self._counters: Dict[str, TokenCounter] = {}
+        self._lock = threading.Lock()
+
+        self.prompts = 0
+        self.totals = {'system': 0, 'summary': 0, 'passages': 0, 'history': 0, 'question': 0}
+        self.passages_dropped = 0
+        self.history_dropped = 0
+
+    def counter_for(self, model_name: Optional[str]) -> TokenCounter:
+        key = model_name or ''
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.get(key)
+                if counter is None:
+                    counter = TokenCounter(model_name)
+                    self._counters[key] = counter
+        return counter
+
+    def build(self, model_name: Optional[str], system: str, passages: List[str], history: List[Dict],
+              render_question: Callable[[str], str], summary: str = None) -> Dict:
+        """
+        Pick what fits in the budget.
+
+        Args:
+            model_name: Ollama model the prompt is for (selects the tokenizer)
+            system: System prompt, always included
+            passages: Retrieved passages, best first
+            history: Candidate past messages, oldest first
+            render_question: Builds the final user message from the joined context
+            summary: Summary of older turns, always included after the system prompt
+
+        Returns:
+            Dict with 'context' (joined passages), 'question' (final user message),
+            'history' (messages kept) and 'report' (token breakdown)
+        """
+        counter = self.counter_for(model_name)
+        system_tokens = counter.count(system) + MESSAGE_OVERHEAD
+        summary_tokens = counter.count(summary) + MESSAGE_OVERHEAD if summary else 0
+        # The question and its template are paid for whatever context ends up in it
+        placeholder = "contexte " * 16
+        question_tokens = counter.count(render_question(placeholder)) - counter.count(placeholder) + MESSAGE_OVERHEAD
+        remaining = self.budget - system_tokens - summary_tokens - question_tokens
+
+        # Passages in rank order; the first one that does not fit is truncated, not skipped
+        kept_passages = []
+        passage_tokens = 0
+        for passage in passages:
+            tokens = counter.count(passage) + counter.count(PASSAGE_SEPARATOR)
+            if tokens <= remaining:
+                kept_passages.append(passage)
+            elif remaining >= MIN_PASSAGE_TOKENS:
+                passage = self._truncate(passage, remaining - counter.count(PASSAGE_SEPARATOR), counter)
+                tokens = counter.count(passage) + counter.count(PASSAGE_SEPARATOR)
+                kept_passages.append(passage)
+            else:
+                break
+            passage_tokens += tokens
+            remaining -= tokens
+            if remaining < MIN_PASSAGE_TOKENS:
+                break
+        context = "".join(f"{PASSAGE_SEPARATOR}{passage}" for passage in kept_passages)
+
+        # Newest turns first, stopping at the first one that does not fit so the history stays contiguous
+        kept_history = []
+        history_tokens = 0
+        for message in reversed(history or []):
+            tokens = counter.count(message.get("content", "")) + MESSAGE_OVERHEAD
+            if tokens > remaining:
+                break
+            kept_history.append(message)
+            history_tokens += tokens
+            remaining -= tokens
+        kept_history.reverse()
+
+        question = render_question(context)
+        question_tokens = counter.count(question) + MESSAGE_OVERHEAD
+        report = {
+            'model': model_name,
+            'method': counter.method,
+            'budget': self.budget,
+            'system': system_tokens,
+            'summary': summary_tokens,
+            'passages': passage_tokens,
+            'passages_used': len(kept_passages),
+            'passages_dropped': len(passages) - len(kept_passages),
+            'history': history_tokens,
+            'history_used': len(kept_history),
+            'history_dropped': len(history or []) - len(kept_history),
+            'question': question_tokens - passage_tokens,
+            'total': system_tokens + summary_tokens + question_tokens + history_tokens
+        }
+        self._record(report)
+        return {'context': context, 'question': question, 'history': kept_history, 'report': report}
+
+    @staticmethod
+    def _truncate(text: str, max_tokens: int, counter: TokenCounter) -> str:
+        """Cut text to about max_tokens, at a sentence or word boundary"""
+        tokens = counter.count(text)
+        if tokens <= max_tokens:
+            return text
+        cut = text[:int(len(text) * max_tokens / tokens)]
+        while cut and counter.count(cut) > max_tokens:
+            cut = cut[:int(len(cut) * 0.9)]
+        for boundary in ('. ', '\n', ' '):
+            position = cut.rfind(boundary)
+            if position > len(cut) // 2:
+                return cut[:position + 1].rstrip()
+        return cut
+
+    def _record(self, report):
+        with self._lock:
+            self.prompts += 1
+            for part in self.totals:
+                self.totals[part] += report[part]
+            self.passages_dropped += report['passages_dropped']
+            self.history_dropped += report['history_dropped']
+
+    def stats(self) -> Dict:
+        """Average tokens per prompt part, to tune the budget against prompt-eval cost"""
+        with self._lock:
+            prompts = self.prompts or 1
+            return {
+                'budget': self.budget,
+                'prompts': self.prompts,
+                'avg_tokens': {part: total / prompts for part, total in self.totals.items()},
+                'passages_dropped': self.passages_dropped,
+                'history_dropped': self.history_dropped
+            }
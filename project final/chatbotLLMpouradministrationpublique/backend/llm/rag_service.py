@@ -1,102 +1,437 @@
 import os
-from models.document import Document as DocumentModel
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from sqlalchemy import tuple_
+from models.document_chunk import DocumentChunk
 from database import db
+from llm.bm25_index import BM25Index
+from llm.index_sync import DocumentIndexSync
 from llm.translation_service import TranslationService
+from llm.translation_materializer import TranslationMaterializer
 from llm.local_model_service import LocalModelService
+from llm.conversation_summarizer import ConversationSummarizer
+from llm.answer_cache import AnswerCache
+from llm.single_flight import SingleFlight, FlightAborted
+from llm.cancellation import CancellationToken, RequestCancelled
+from llm.generation_limiter import OllamaOverloadedError
+from llm.stage_pipeline import StagePipeline, StageStats, format_timings
+from config import Config
+
+# Seconds between cancellation checks while waiting on another request's answer
+FOLLOWER_POLL_INTERVAL = 0.25
 
 class RAGService:
     def __init__(self):
-        # Initialize Services (no embeddings needed for simple keyword search)
-        print("Initializing RAG Service (Simplified Mode)...")
+        # Initialize Services (no embeddings needed for BM25 keyword search)
+        print("Initializing RAG Service (BM25 Mode)...")
         self.translation_service = TranslationService()
         self.local_model = LocalModelService()
+        
+        # The index needs an app context, so it is built on first retrieval
+        self.index = BM25Index()
+        self.index_sync = DocumentIndexSync(self.index)
+        self.index_sync.register_listeners()
+        self._index_lock = threading.Lock()
+        
+        # Passages are translated to French once at ingest, never per query
+        self.materializer = TranslationMaterializer(
+            self.translation_service,
+            pivot_language='fr',
+            retry_after=Config.TRANSLATION_MATERIALIZE_RETRY_AFTER,
+            max_failed=Config.TRANSLATION_MATERIALIZE_FAILED_MAX
+        )
+        self.index_sync.add_change_listener(self.materializer.notify)
+        
+        # Answers to history-less questions, dropped when a source document changes
+        self.answer_cache = AnswerCache(Config.ANSWER_CACHE_ENTRIES, Config.ANSWER_CACHE_TTL)
+        self.index_sync.add_change_listener(self.answer_cache.invalidate)
+        
+        # Concurrent identical questions wait on one generation (answer_cache keys)
+        self.inflight = SingleFlight()
+        
+        # Old turns are folded into a per-conversation summary after each reply
+        self.summarizer = ConversationSummarizer(self.local_model, Config.SUMMARY_KEEP_RECENT, Config.SUMMARY_BATCH)
+        
+        # Independent request stages (detection, translation, index searches) share this pool
+        self.executor = ThreadPoolExecutor(max_workers=Config.PIPELINE_WORKERS, thread_name_prefix='rag-stage')
+        self.stage_stats = StageStats()
         print("RAG Service Ready!")
     
+    def init_app(self, app):
+        """Start background maintenance tasks that need the Flask app"""
+        self.index_sync.start_reconciler(app, app.config.get('INDEX_RECONCILE_INTERVAL', 300))
+        self.materializer.start(app, app.config.get('TRANSLATION_MATERIALIZE_INTERVAL', 600))
+        self.local_model.ollama.start_health_probe(app.config.get('OLLAMA_HEALTH_INTERVAL', 10))
+        self.local_model.start_model_discovery(app.config.get('OLLAMA_MODEL_REFRESH_INTERVAL', 60))
+        self.summarizer.start(app)
+    
+    def build_index(self):
+        """Build the BM25 index from all active documents (requires app context)"""
+        self.index_sync.rebuild()
+    
+    def _ensure_index(self):
+        if self.index_sync.ready:
+            return
+        with self._index_lock:
+            if not self.index_sync.ready:
+                self.build_index()
+    
+    def search_passages(self, query: str, top_k: int = 3):
+        """Return the top_k passages (DocumentChunk) of active documents for the query, best first"""
+        self._ensure_index()
+        return self._load_passages([key for score, key in self.index.search(query, top_k=top_k)])
+    
+    def _load_passages(self, keys):
+        """DocumentChunk rows of active documents for (document_id, position) keys, in key order"""
+        if not keys:
+            return []
+        
+        by_key = {
+            (chunk.document_id, chunk.position): chunk
+            for chunk in DocumentChunk.query.filter(
+                tuple_(DocumentChunk.document_id, DocumentChunk.position).in_(keys)
+            ).all()
+            if chunk.document.active
+        }
+        return [by_key[key] for key in keys if key in by_key]
+    
     def detect_language(self, text: str) -> str:
         """Detect language of text"""
         return self.translation_service.detect_language(text)
 
-    def retrieve_and_generate(self, question: str, language: str = 'fr', conversation_history: list = None):
-        """Retrieve relevant documents and generate answer using Local Models"""
+    @staticmethod
+    def _merge_hits(hit_lists, top_k: int = 3):
+        """Keys of the best top_k hits over several searches of the same index"""
+        best = {}
+        for hits in hit_lists:
+            for score, key in hits:
+                best[key] = max(score, best.get(key, 0.0))
+        return sorted(best, key=best.get, reverse=True)[:top_k]
+    
+    def _retrieve(self, question: str, language: str, detected_language: str = None, cancel: CancellationToken = None):
+        """
+        Steps shared by the blocking and streaming pipelines: detect, translate, retrieve.
+        
+        Detection, question translation and the index searches run as a stage
+        DAG on the shared pool; the database reads stay on the caller's thread.
+        """
+        self._ensure_index()
+        pipeline = StagePipeline(self.executor, cancel)
+        translate = self.translation_service.translate
+        
+        # Step 1: Detect Input Language (callers that already detected it pass it in)
+        pipeline.stage("detect", lambda: detected_language or self.translation_service.detect_language(question))
+        
+        # Step 2: Translate to French (Admin Model Language); an explicit language need not wait for detection
+        if language:
+            pipeline.stage("translate_question", lambda: translate(question, language, 'fr', cancel))
+        else:
+            pipeline.stage("translate_question", lambda detected: translate(question, detected, 'fr', cancel), "detect")
+        
+        # Step 3: BM25 retrieval over the in-memory inverted index: the original
+        # question finds same-language passages while the translation runs
+        pipeline.stage("search_original", lambda: self.index.search(question, top_k=3))
+        pipeline.stage("search_french", lambda french: self.index.search(french, top_k=3), "translate_question")
+        
+        stages = pipeline.run()
+        detected_lang = stages["detect"]
+        user_lang = language if language else detected_lang
+        prompt_in_french = stages["translate_question"]
+        print(f"Processing Query: {question} (Lang: {user_lang})")
+        print(f"Translated to French: {prompt_in_french}")
+        
+        # A model that is strong in the user's language answers it directly: the
+        # French question is then only used for retrieval and the answer is not translated back
+        direct = user_lang != 'fr' and self.local_model.answers_natively(user_lang)
+        generation_lang = user_lang if direct else 'fr'
+        if direct:
+            print(f"Direct generation in {user_lang} (no translation round trip)")
+        
+        # Whole passages, best first; the prompt builder decides how many fit
+        # Passages not in the generation language use their precomputed French
+        # translation; until it is materialized the original text is used
+        with pipeline.inline("load_passages"):
+            top_passages = self._load_passages(self._merge_hits([stages["search_french"], stages["search_original"]]))
+            translations = self.materializer.lookup(top_passages)
+        passages = [
+            passage.content if passage.language == generation_lang
+            else translations.get(passage.content_hash, passage.content)
+            for passage in top_passages
+        ]
+        
+        print(f"Retrieved Context Length: {sum(len(passage) for passage in passages)}")
+        
+        # One source per parent document, in rank order
+        top_docs = list({passage.document_id: passage.document for passage in top_passages}.values())
+        sources = [
+            {
+                "title": doc.title,
+                "category": doc.category or "general",
+                "source": doc.source or "admin"
+            }
+            for doc in top_docs
+        ]
+        
+        # The answer depends on exactly these passages at these document versions
+        ranked = [
+            (passage.document_id, passage.position, self.index_sync.versions.get(passage.document_id))
+            for passage in top_passages
+        ]
+        cache_key = AnswerCache.make_key(prompt_in_french, ranked, self.local_model.model_signature(), user_lang)
+        
+        # How much of the question the best passage covers; weak retrieval needs the large model
+        retrieval_confidence = max(
+            self.index.coverage(query, (top_passages[0].document_id, top_passages[0].position))
+            for query in (prompt_in_french, question)
+        ) if top_passages else 0.0
+        
+        return {
+            "user_lang": user_lang,
+            "detected_lang": detected_lang,
+            "prompt_in_french": prompt_in_french,
+            "generation_lang": generation_lang,
+            "model_question": question if direct else prompt_in_french,
+            "passages": passages,
+            "sources": sources,
+            "cache_key": cache_key,
+            "retrieval_confidence": retrieval_confidence,
+            "pipeline": pipeline,
+            "document_ids": [doc.id for doc in top_docs]
+        }
+    
+    def _report_timings(self, turn):
+        timings = turn["pipeline"].timings
+        self.stage_stats.record(timings)
+        print(f"Stage timings: {format_timings(timings)}")
+    
+    def _cached_answer(self, turn):
+        cached = self.answer_cache.get(turn["cache_key"])
+        if cached is None:
+            return None
+        print(f"Answer cache hit ({turn['user_lang']})")
+        return dict(cached, original_language=turn["detected_lang"])
+    
+    def _cache_answer(self, turn, answer, result):
+        # Never cache the canned reply given while the model is unavailable
+        if answer and not self.local_model.is_fallback_response(answer):
+            self.answer_cache.put(turn["cache_key"], result, turn["document_ids"])
+    
+    def _join_flight(self, turn, cacheable, cancel: CancellationToken = None):
+        """
+        Find an answer for a history-less question without generating it twice.
+        
+        Returns:
+            (result, flight): result is a cached or shared answer, or None if this
+            caller must generate; flight is set when this caller leads and must be landed
+        """
+        if not cacheable:
+            return None, None
+        
+        future, leader = self.inflight.begin(turn["cache_key"])
+        if leader:
+            cached = self._cached_answer(turn)
+            if cached:
+                self.inflight.finish(turn["cache_key"], future, cached)
+                return cached, None
+            return None, future
+        
+        # An identical question is being answered right now: wait for it, unless this turn is cancelled
+        while True:
+            try:
+                shared = future.result(timeout=FOLLOWER_POLL_INTERVAL)
+                break
+            except FutureTimeoutError:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+            except Exception:
+                return None, None  # the leader failed or gave up; answer it ourselves
+        print(f"Shared an in-flight answer ({turn['user_lang']})")
+        return dict(shared, original_language=turn["detected_lang"]), None
+    
+    def _land_flight(self, turn, future, result):
+        if future is not None:
+            self.inflight.finish(turn["cache_key"], future, result, None if result is not None else FlightAborted())
+    
+    def retrieve_and_generate(self, question: str, language: str = 'fr', conversation_history: list = None,
+                              detected_language: str = None, conversation_id: int = None, conversation_summary: str = None,
+                              cancel: CancellationToken = None):
+        """
+        Retrieve relevant documents and generate answer using Local Models.
+        
+        Cancelling cancel stops generation and translation; the result then holds
+        the partial, untranslated answer and "cancelled": True.
+        """
         try:
-            # Step 1: Detect Input Language
-            detected_lang = self.translation_service.detect_language(question)
-            user_lang = language if language else detected_lang
-            
-            print(f"Processing Query: {question} (Lang: {user_lang})")
-            
-            # Step 2: Translate to French (Admin Model Language)
-            prompt_in_french = self.translation_service.translate(question, user_lang, 'fr')
-            print(f"Translated to French: {prompt_in_french}")
-            
-            # Step 3: Simple keyword-based document retrieval
-            # Extract keywords from the French question
-            keywords = prompt_in_french.lower().split()
-            
-            # Query database for documents containing these keywords
-            documents = DocumentModel.query.filter_by(active=True).all()
-            
-            # Simple scoring: count keyword matches
-            scored_docs = []
-            for doc in documents:
-                content_lower = doc.content.lower()
-                score = sum(1 for keyword in keywords if keyword in content_lower)
-                if score > 0:
-                    scored_docs.append((score, doc))
+            turn = self._retrieve(question, language, detected_language, cancel)
+            user_lang = turn["user_lang"]
             
-            # Sort by score and take top 3
-            scored_docs.sort(reverse=True, key=lambda x: x[0])
-            top_docs = [doc for score, doc in scored_docs[:3]]
+            # Only the first question of a conversation is independent of context
+            cacheable = not conversation_history and not conversation_summary
+            pipeline = turn["pipeline"]
+            with pipeline.inline("answer_lookup"):
+                ready, flight = self._join_flight(turn, cacheable, cancel)
+            if ready:
+                self._report_timings(turn)
+                return ready
             
-            # Build context
-            context_text = ""
-            for doc in top_docs:
-                doc_content = doc.content
-                doc_lang = doc.language
+            result = None
+            answer = ""
+            try:
+                # Step 4: Generate Response using Intelligent Local Model
+                with pipeline.inline("generate"):
+                    answer = self.local_model.generate_response(
+                        context=turn["passages"],
+                        question=turn["model_question"],
+                        language=turn["generation_lang"],
+                        conversation_history=conversation_history,
+                        conversation_id=conversation_id,
+                        conversation_summary=conversation_summary,
+                        retrieval_confidence=turn["retrieval_confidence"],
+                        cancel=cancel
+                    )
+                if cancel is not None and cancel.cancelled:
+                    return self._cancelled_result(answer, turn["sources"], turn["generation_lang"], cancel, user_lang)
+                print(f"Generated Answer ({turn['generation_lang']}): {answer[:100]}...")
                 
-                # Translate to French if needed
-                if doc_lang != 'fr':
-                    doc_content = self.translation_service.translate(doc_content, doc_lang, 'fr')
+                # Step 5: Translate back to User Language (a no-op for direct generation)
+                with pipeline.inline("translate_answer"):
+                    final_answer = self.translation_service.translate(answer, turn["generation_lang"], user_lang, cancel)
+                print(f"Final Answer ({user_lang}): {final_answer[:100]}...")
                 
-                context_text += f"\\n---\\n{doc_content[:500]}"  # Limit context size
-            
-            print(f"Retrieved Context Length: {len(context_text)}")
-            
-            # Step 4: Generate Response using Intelligent Local Model
-            answer_french = self.local_model.generate_response(
-                context=context_text,
-                question=prompt_in_french,
-                language='fr',
-                conversation_history=conversation_history
-            )
-            print(f"Generated French Answer: {answer_french[:100]}...")
+                result = {
+                    "answer": final_answer,
+                    "sources": turn["sources"],
+                    "language": user_lang,
+                    "original_language": turn["detected_lang"]
+                }
+                if cacheable:
+                    self._cache_answer(turn, answer, result)
+                return result
+            except RequestCancelled:
+                return self._cancelled_result(answer, turn["sources"], turn["generation_lang"], cancel, user_lang)
+            finally:
+                self._land_flight(turn, flight, result)
+                self._report_timings(turn)
             
-            # Step 5: Translate back to User Language
-            final_answer = self.translation_service.translate(answer_french, 'fr', user_lang)
-            print(f"Final Answer ({user_lang}): {final_answer[:100]}...")
+        except RequestCancelled:
+            return self._cancelled_result("", [], language, cancel)
+        except OllamaOverloadedError:
+            raise  # the caller answers 503 rather than storing an error reply
+        except Exception as e:
+            print(f"Error in retrieve_and_generate: {e}")
+            import traceback
+            traceback.print_exc()
+            return self._error_result(language)
+    
+    def retrieve_and_generate_stream(self, question: str, language: str = 'fr', conversation_history: list = None,
+                                     detected_language: str = None, conversation_id: int = None,
+                                     conversation_summary: str = None, cancel: CancellationToken = None):
+        """
+        Streaming variant of retrieve_and_generate.
+        
+        Yields:
+            ("sources", sources) once retrieval is done, ("token", text) events
+            as the answer is produced (whole translated sentences for non-French
+            users), then one ("done", result) event with the same result dict as
+            retrieve_and_generate; a cancelled result holds the text already sent
+        """
+        try:
+            turn = self._retrieve(question, language, detected_language, cancel)
+            user_lang = turn["user_lang"]
             
-            sources = [
-                {
-                    "title": doc.title,
-                    "category": doc.category or "general",
-                    "source": doc.source or "admin"
-                }
-                for doc in top_docs
-            ]
+            cacheable = not conversation_history and not conversation_summary
+            pipeline = turn["pipeline"]
+            with pipeline.inline("answer_lookup"):
+                ready, flight = self._join_flight(turn, cacheable, cancel)
+            if ready:
+                self._report_timings(turn)
+                yield "token", ready["answer"]
+                yield "done", ready
+                return
             
-            return {
-                "answer": final_answer,
-                "sources": sources,
-                "language": user_lang,
-                "original_language": detected_lang
-            }
+            result = None
+            answer_parts = []
+            try:
+                yield "sources", turn["sources"]
+                
+                # Step 4: Stream Response from the Local Model
+                tokens = self.local_model.generate_response_stream(
+                    context=turn["passages"],
+                    question=turn["model_question"],
+                    language=turn["generation_lang"],
+                    conversation_history=conversation_history,
+                    conversation_id=conversation_id,
+                    conversation_summary=conversation_summary,
+                    retrieval_confidence=turn["retrieval_confidence"],
+                    cancel=cancel
+                )
+                generated_parts = []
+                
+                def collect(stream):
+                    for token in stream:
+                        generated_parts.append(token)
+                        yield token
+                
+                # Step 5: Translate back sentence by sentence as they complete
+                # Generation and back-translation overlap here, so they are timed as one stage
+                with pipeline.inline("generate_and_translate"):
+                    for piece in self.translation_service.translate_stream(
+                        collect(tokens), turn["generation_lang"], user_lang, cancel
+                    ):
+                        answer_parts.append(piece)
+                        yield "token", piece
+                
+                final_answer = "".join(answer_parts).strip()
+                if cancel is not None and cancel.cancelled:
+                    result = self._cancelled_result(final_answer, turn["sources"], user_lang, cancel)
+                else:
+                    print(f"Final Answer ({user_lang}): {final_answer[:100]}...")
+                    result = {
+                        "answer": final_answer,
+                        "sources": turn["sources"],
+                        "language": user_lang,
+                        "original_language": turn["detected_lang"]
+                    }
+                    if cacheable:
+                        self._cache_answer(turn, "".join(generated_parts), result)
+            except RequestCancelled:
+                result = self._cancelled_result("".join(answer_parts), turn["sources"], user_lang, cancel)
+            finally:
+                # Followers get the result, or are told to generate themselves if the client left or cancelled
+                self._land_flight(turn, flight, None if result is None or result.get("cancelled") else result)
+                self._report_timings(turn)
+            yield "done", result
             
+        except RequestCancelled:
+            yield "done", self._cancelled_result("", [], language, cancel)
+        except OllamaOverloadedError:
+            raise
         except Exception as e:
-            print(f"Error in retrieve_and_generate: {e}")
+            print(f"Error in retrieve_and_generate_stream: {e}")
             import traceback
             traceback.print_exc()
-            return {
-                "answer": "Une erreur s'est produite lors du traitement. Veuillez réessayer.",
-                "sources": [],
-                "language": language
-            }
+            yield "done", self._error_result(language)
+    
+    def _cancelled_result(self, answer, sources, language, cancel, user_lang=None):
+        """
+        Partial answer of a cancelled turn. A blocking turn is cancelled before its
+        answer is translated back; such a partial keeps the generation language
+        and is flagged untranslated rather than spending the translation anyway.
+        """
+        print(f"Turn cancelled ({cancel.reason}) after {len(answer)} characters")
+        result = {
+            "answer": answer.strip(),
+            "sources": sources,
+            "language": language,
+            "cancelled": True
+        }
+        if user_lang and user_lang != language and result["answer"]:
+            result["untranslated"] = True
+        return result
+    
+    def _error_result(self, language):
+        return {
+            "answer": "Une erreur s'est produite lors du traitement. Veuillez réessayer.",
+            "sources": [],
+            "language": language
+        }
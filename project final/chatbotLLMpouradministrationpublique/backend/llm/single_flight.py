@@ -0,0 +1,57 @@
+"""
+Single Flight - Coalesce identical work that is already in progress
+The first caller for a key does the work; callers arriving while it runs
+wait for its result instead of repeating it
+"""
+import threading
+from concurrent.futures import Future
+from typing import Dict, Tuple
+
+
+class FlightAborted(Exception):
+    """The leading caller stopped before producing a result; followers should do the work themselves"""
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def begin(self, key: str) -> Tuple[Future, bool]:
+        """
+        Join the flight for key.
+
+        Returns:
+            (future, is_leader); the leader must call finish() exactly once,
+            followers wait on future.result()
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.followers += 1
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            self.leaders += 1
+            return future, True
+
+    def finish(self, key: str, future: Future, result=None, error: BaseException = None):
+        """Publish the leader's result (or error) and close the flight"""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> Dict:
+        """Flights in progress and how many callers were coalesced"""
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'followers': self.followers
+            }
@@ -0,0 +1,93 @@
+"""
+Stage Pipeline - Run the independent steps of a request concurrently
+Stages declare the stages they depend on; each one is submitted to a shared
+bounded thread pool as soon as its inputs are ready, so a request takes about
+as long as its slowest chain of stages instead of the sum of all of them.
+Stages run without the Flask app context: database work stays on the caller.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+from llm.cancellation import CancellationToken
+
+
+class StagePipeline:
+    def __init__(self, executor: Executor, cancel: CancellationToken = None):
+        self.executor = executor
+        self.cancel = cancel
+        self._stages: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {}
+        self.timings: Dict[str, float] = {}
+
+    def stage(self, name: str, work: Callable, *depends_on: str):
+        """Add a stage; work is called with the results of depends_on, in order"""
+        self._stages[name] = (work, depends_on)
+
+    def _timed_call(self, name, work, args):
+        start_time = time.perf_counter()
+        try:
+            return work(*args)
+        finally:
+            self.timings[name] = time.perf_counter() - start_time
+
+    def run(self) -> Dict[str, object]:
+        """Run every stage and return {name: result}; the first stage error is raised"""
+        results: Dict[str, object] = {}
+        pending = dict(self._stages)
+        running = {}
+
+        while pending or running:
+            # Stages not yet started are never submitted for a cancelled request
+            if self.cancel is not None:
+                self.cancel.raise_if_cancelled()
+            for name, (work, depends_on) in list(pending.items()):
+                if all(dependency in results for dependency in depends_on):
+                    args = [results[dependency] for dependency in depends_on]
+                    running[self.executor.submit(self._timed_call, name, work, args)] = name
+                    del pending[name]
+            if not running:
+                raise ValueError(f"Stages with unknown dependencies: {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+        return results
+
+    @contextmanager
+    def inline(self, name: str):
+        """Time a stage that runs on the caller's thread (database access, generation)"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start_time
+
+
+class StageStats:
+    def __init__(self):
+        """Running per-stage latency totals across requests"""
+        self._totals: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, timings: Dict[str, float]):
+        with self._lock:
+            for name, seconds in timings.items():
+                self._totals[name] = self._totals.get(name, 0.0) + seconds
+                self._counts[name] = self._counts.get(name, 0) + 1
+
+    def stats(self) -> Dict:
+        """Average milliseconds per stage"""
+        with self._lock:
+            return {
+                name: {
+                    'count': self._counts[name],
+                    'avg_ms': round(1000 * self._totals[name] / self._counts[name], 1)
+                }
+                for name in self._totals
+            }
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    return " ".join(f"{name}={1000 * seconds:.0f}ms" for name, seconds in timings.items())
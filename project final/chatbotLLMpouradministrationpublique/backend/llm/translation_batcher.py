@@ -0,0 +1,141 @@
+"""
+Translation Batcher - Cross-request micro-batching for MarianMT inference
+Each language pair gets one worker that gathers pending segments from all
+request threads for a few milliseconds and runs a single generate on them
+"""
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from typing import Callable, Dict, List
+from llm.cancellation import CancellationToken, RequestCancelled
+
+
+class BatchingExecutor:
+    def __init__(self, run_batch: Callable[[List[str]], List[str]], max_batch: int = 16,
+                 max_wait_ms: float = 5, name: str = 'batcher'):
+        """
+        Initialize the executor.
+
+        Args:
+            run_batch: Translates a list of segments, returning results in the same order
+            max_batch: Maximum segments per generate call
+            max_wait_ms: How long the first job of a batch waits for company
+        """
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._worker = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, segment: str) -> Future:
+        """Queue a segment; the future resolves to its translation"""
+        future = Future()
+        self._queue.put((segment, future))
+        return future
+
+    def _collect(self):
+        jobs = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(jobs) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return jobs
+
+    def _loop(self):
+        while True:
+            jobs = self._collect()
+
+            # Drop jobs whose caller gave up, and translate each distinct segment once
+            by_segment: Dict[str, List[Future]] = {}
+            for segment, future in jobs:
+                if future.set_running_or_notify_cancel():
+                    by_segment.setdefault(segment, []).append(future)
+            if not by_segment:
+                continue
+
+            segments = list(by_segment)
+            try:
+                results = self.run_batch(segments)
+            except Exception as e:
+                for futures in by_segment.values():
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(segments)
+            for segment, result in zip(segments, results):
+                for future in by_segment[segment]:
+                    future.set_result(result)
+
+
+class TranslationBatcher:
+    def __init__(self, run_batch: Callable[[List[str], str], List[str]], max_batch: int = 16, max_wait_ms: float = 5,
+                 name: str = 'translation-batcher'):
+        """Initialize per-language-pair executors that call run_batch(segments, key)"""
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self.executors: Dict[str, BatchingExecutor] = {}
+        self._lock = threading.Lock()
+
+    def executor_for(self, key: str) -> BatchingExecutor:
+        """Return (creating on first use) the executor for a language pair"""
+        executor = self.executors.get(key)
+        if executor is None:
+            with self._lock:
+                executor = self.executors.get(key)
+                if executor is None:
+                    executor = BatchingExecutor(
+                        lambda segments: self.run_batch(segments, key),
+                        max_batch=self.max_batch,
+                        max_wait_ms=self.max_wait_ms,
+                        name=f"{self.name}-{key}"
+                    )
+                    self.executors[key] = executor
+        return executor
+
+    def translate(self, segments: List[str], key: str, cancel: CancellationToken = None) -> List[str]:
+        """
+        Translate segments alongside other requests' pending segments for the same pair.
+
+        Cancelling cancel drops the segments that are still queued; a batch
+        already running finishes for the other requests sharing it.
+        """
+        executor = self.executor_for(key)
+        futures = [executor.submit(segment) for segment in segments]
+        if cancel is not None:
+            cancel.on_cancel(lambda: [future.cancel() for future in futures])
+        try:
+            return [future.result() for future in futures]
+        except CancelledError:
+            raise RequestCancelled(cancel.reason if cancel is not None else None)
+
+    def pending(self) -> int:
+        """Segments queued across all language pairs and not yet picked up by a batch"""
+        with self._lock:
+            executors = list(self.executors.values())
+        return sum(executor._queue.qsize() for executor in executors)
+
+    def stats(self) -> Dict:
+        """Average batch size per language pair"""
+        with self._lock:
+            executors = list(self.executors.items())
+        return {
+            key: {
+                'batches': executor.batches,
+                'items': executor.items,
+                'avg_batch_size': executor.items / executor.batches if executor.batches else 0.0
+            }
+            for key, executor in executors
+        }
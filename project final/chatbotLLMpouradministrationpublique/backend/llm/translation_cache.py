@@ -0,0 +1,166 @@
+"""
+Translation Cache - Two-tier cache for MarianMT translations
+An in-memory LRU tier backed by an on-disk SQLite tier that survives restarts
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share a cache entry"""
+    return WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class TranslationCache:
+    def __init__(self, path: str, memory_entries: int = 2048, disk_max_mb: int = 256):
+        """
+        Initialize the cache.
+
+        Args:
+            path: SQLite file for the disk tier (None keeps only the memory tier)
+            memory_entries: Maximum entries in the memory tier
+            disk_max_mb: Maximum size of stored translations in the disk tier
+        """
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_mb * 1024 * 1024
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_errors = 0
+
+        self._db = None
+        self._disk_bytes = 0
+        if path:
+            try:
+                directory = os.path.dirname(os.path.abspath(path))
+                os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "key TEXT PRIMARY KEY, translation TEXT NOT NULL, "
+                    "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+                self._db.commit()
+                self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"Translation cache disk tier disabled ({path}): {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(text: str, source: str, target: str, model_name: str) -> str:
+        """Hash of (normalized text, source, target, model name)"""
+        raw = '\x1f'.join([model_name, source, target, normalize_text(text)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, text: str, source: str, target: str, model_name: str) -> Optional[str]:
+        """Return the cached translation or None"""
+        key = self.make_key(text, source, target, model_name)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT translation FROM translations WHERE key = ?", (key,)).fetchone()
+                    if row:
+                        self._db.execute("UPDATE translations SET last_used = ? WHERE key = ?", (time.time(), key))
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    self._disk_error('read', e)
+                    row = None
+                if row:
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, source: str, target: str, model_name: str, translation: str):
+        """Store a translation in both tiers"""
+        key = self.make_key(text, source, target, model_name)
+        with self._lock:
+            self._remember(key, translation)
+            if self._db is None:
+                return
+
+            size = len(translation.encode('utf-8'))
+            try:
+                previous = self._db.execute("SELECT size FROM translations WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO translations (key, translation, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, translation, size, time.time())
+                )
+                self._disk_bytes += size - (previous[0] if previous else 0)
+                if self._disk_bytes > self.disk_max_bytes:
+                    self._evict_disk()
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._disk_error('write', e)
+
+    def _remember(self, key, translation):
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        # Drop least recently used rows until we are back under 90% of the budget
+        target = int(self.disk_max_bytes * 0.9)
+        rows = self._db.execute("SELECT key, size FROM translations ORDER BY last_used").fetchall()
+        victims = []
+        freed = 0
+        for key, size in rows:
+            if self._disk_bytes - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        self._db.executemany("DELETE FROM translations WHERE key = ?", victims)
+        self._disk_bytes -= freed
+        self.evictions += len(victims)
+
+    def _disk_error(self, action, error):
+        # The memory tier keeps serving; a busy file (another worker holds the lock)
+        # is retried on the next call, a corrupt one disables the disk tier
+        self.disk_errors += 1
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+        if isinstance(error, sqlite3.OperationalError):
+            print(f"Translation cache disk {action} skipped: {error}")
+            return
+        print(f"Translation cache disk tier disabled: {error}")
+        self._db = None
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'disk_errors': self.disk_errors,
+                'memory_entries': len(self._memory),
+                'disk_bytes': self._disk_bytes
+            }
@@ -0,0 +1,167 @@
+"""
+Translation Materializer - Translates passages into the pivot language once, at ingest
+Results live in document_translations keyed by passage content hash, so queries
+only do a lookup instead of running MarianMT
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+from database import db
+from models.document import Document as DocumentModel
+from models.document_chunk import DocumentChunk
+from models.document_translation import DocumentTranslation
+
+# Seconds the backfill waits while live requests have translations queued
+LIVE_YIELD_INTERVAL = 0.05
+
+
+class TranslationMaterializer:
+    def __init__(self, translation_service, pivot_language: str = 'fr', retry_after: int = 3600,
+                 max_failed: int = 10000):
+        """
+        Initialize the materialization stage.
+
+        Args:
+            translation_service: Service whose backfill batcher translates the passages
+            pivot_language: Language every passage is translated into
+            retry_after: Seconds before a passage the model could not handle is tried again
+            max_failed: Failed passages remembered at most (oldest are forgotten first)
+        """
+        self.translation_service = translation_service
+        self.pivot_language = pivot_language
+        self.retry_after = retry_after
+        self.max_failed = max_failed
+        # (content_hash, language) -> time the translation model could not handle it
+        self.failed: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._failed_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+
+    def pending_query(self):
+        """Passages of active documents that have no pivot-language translation yet"""
+        return db.session.query(DocumentChunk.content_hash, DocumentChunk.language, DocumentChunk.content).join(
+            DocumentModel, DocumentChunk.document_id == DocumentModel.id
+        ).outerjoin(
+            DocumentTranslation,
+            db.and_(
+                DocumentTranslation.content_hash == DocumentChunk.content_hash,
+                DocumentTranslation.source_language == DocumentChunk.language,
+                DocumentTranslation.target_language == self.pivot_language
+            )
+        ).filter(
+            DocumentModel.active.is_(True),
+            DocumentChunk.language != self.pivot_language,
+            DocumentChunk.content_hash.isnot(None),
+            DocumentTranslation.id.is_(None)
+        ).distinct()
+
+    def materialize(self, limit: int = None) -> int:
+        """
+        Translate pending passages and persist them (requires app context).
+
+        Args:
+            limit: Maximum number of passages to translate in this pass
+
+        Returns:
+            Number of translations stored
+        """
+        query = self.pending_query()
+        if limit:
+            query = query.limit(limit)
+        pending = query.all()
+
+        stored = 0
+        for content_hash, language, content in pending:
+            if self._recently_failed((content_hash, language)):
+                continue
+            # Live requests go first: wait until their translations have been picked up
+            while self.translation_service.batcher.pending():
+                time.sleep(LIVE_YIELD_INTERVAL)
+            translated = self.translation_service.translate(content, language, self.pivot_language, background=True)
+            if not translated or translated == content:
+                print(f"Could not translate passage {content_hash[:8]} ({language}->{self.pivot_language})")
+                self._remember_failure((content_hash, language))
+                continue
+
+            db.session.add(DocumentTranslation(
+                content_hash=content_hash,
+                source_language=language,
+                target_language=self.pivot_language,
+                content=translated
+            ))
+            try:
+                db.session.commit()
+                stored += 1
+            except Exception as e:
+                # Another worker stored the same passage first
+                db.session.rollback()
+                print(f"Skipping translation {content_hash[:8]}: {e}")
+
+        if stored:
+            print(f"Materialized {stored} passage translations")
+        return stored
+
+    def _recently_failed(self, passage_key) -> bool:
+        with self._failed_lock:
+            failed_at = self.failed.get(passage_key)
+            if failed_at is None:
+                return False
+            if time.monotonic() - failed_at > self.retry_after:
+                del self.failed[passage_key]
+                return False
+            return True
+
+    def _remember_failure(self, passage_key):
+        with self._failed_lock:
+            self.failed[passage_key] = time.monotonic()
+            self.failed.move_to_end(passage_key)
+            while len(self.failed) > self.max_failed:
+                self.failed.popitem(last=False)
+
+    def lookup(self, passages) -> Dict[str, str]:
+        """Return {content_hash: pivot translation} for the given DocumentChunk passages"""
+        wanted = {
+            (passage.content_hash, passage.language)
+            for passage in passages
+            if passage.language != self.pivot_language and passage.content_hash
+        }
+        if not wanted:
+            return {}
+
+        rows = DocumentTranslation.query.filter(
+            DocumentTranslation.content_hash.in_([content_hash for content_hash, _ in wanted]),
+            DocumentTranslation.target_language == self.pivot_language
+        ).all()
+        found = {
+            row.content_hash: row.content
+            for row in rows
+            if (row.content_hash, row.source_language) in wanted
+        }
+        if any(content_hash not in found and not self._recently_failed((content_hash, language))
+               for content_hash, language in wanted):
+            self.notify()
+        return found
+
+    def notify(self, doc_ids: Iterable[int] = None):
+        """Wake the background worker (used as an index change listener)"""
+        self._wake.set()
+
+    def start(self, app, interval: int):
+        """Run materialize() when woken, and at least every interval seconds, in a daemon thread"""
+        if self._worker is not None or interval <= 0:
+            return
+
+        def loop():
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                try:
+                    with app.app_context():
+                        self.materialize()
+                        db.session.remove()
+                except Exception as e:
+                    print(f"Error materializing translations: {e}")
+
+        self._worker = threading.Thread(target=loop, name='translation-materializer', daemon=True)
+        self._worker.start()
@@ -1,12 +1,31 @@
 from transformers import MarianMTModel, MarianTokenizer
-import langdetect
+import re
 import torch
+from config import Config
+from llm.translation_cache import TranslationCache
+from llm.translation_batcher import TranslationBatcher
+from llm.model_registry import TranslationModelRegistry
+from llm.language_detector import detect_language
+
+# Separators kept between translated segments: line breaks and whitespace after
+# sentence punctuation (but not after a list number such as "1." starting a line)
+SEGMENT_SEPARATOR = re.compile(r"(\s*\n\s*|(?<=[.!?؟…])(?<!^[0-9]\.)(?<!^[0-9][0-9]\.)\s+)", re.MULTILINE)
+CLAUSE_BREAK = re.compile(r"(?<=[,;:،؛])\s+")
+MAX_SEGMENT_CHARS = 400  # keeps every segment well under the 512-token model limit
+INFERENCE_MODES = ('fp32', 'int8', 'bf16')
 
 class TranslationService:
-    def __init__(self):
+    def __init__(self, inference_mode: str = None):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.models = {}
-        self.tokenizers = {}
+        
+        # fp32 (default), int8 dynamic quantization of Linear layers (CPU only), or bf16 weights
+        self.inference_mode = (inference_mode or Config.TRANSLATION_INFERENCE_MODE).lower()
+        if self.inference_mode not in INFERENCE_MODES:
+            print(f"Unknown translation inference mode '{self.inference_mode}', using fp32")
+            self.inference_mode = 'fp32'
+        if self.inference_mode == 'int8' and self.device != 'cpu':
+            print("int8 dynamic quantization is CPU only, using fp32")
+            self.inference_mode = 'fp32'
         # Pre-load Arabic<->English models as requested (user mentioned ar-en, but also ar-fr is common in Morocco. 
         # The user specifically requested Helsinki-NLP/opus-mt-ar-en and en-ar. 
         # But also mentioned translating to "French or Admin Model Language". 
@@ -31,53 +50,197 @@ class TranslationService:
             'en-fr': 'Helsinki-NLP/opus-mt-en-fr'
         }
         
+        # Loaded models live in a memory-budgeted LRU; failed loads are remembered for a while
+        self.registry = TranslationModelRegistry(
+            self._load_pretrained,
+            budget_mb=Config.TRANSLATION_MODEL_BUDGET_MB,
+            failure_ttl=Config.TRANSLATION_MODEL_FAILURE_TTL
+        )
+        
+        # Repeated questions and answer sentences are served from cache instead of model.generate
+        self.cache = TranslationCache(
+            Config.TRANSLATION_CACHE_PATH,
+            memory_entries=Config.TRANSLATION_CACHE_MEMORY_ENTRIES,
+            disk_max_mb=Config.TRANSLATION_CACHE_DISK_MB
+        )
+        
+        # Segments from concurrent requests share one generate call per language pair
+        self.batch_size = Config.TRANSLATION_BATCH_MAX_SIZE
+        self.batcher = TranslationBatcher(
+            self._generate_batch,
+            max_batch=self.batch_size,
+            max_wait_ms=Config.TRANSLATION_BATCH_MAX_WAIT_MS
+        )
+        
+        # Ingest-time backfill gets its own small batches so it never joins or delays a live batch
+        self.backfill_batcher = TranslationBatcher(
+            self._generate_batch,
+            max_batch=Config.TRANSLATION_BACKFILL_BATCH_SIZE,
+            max_wait_ms=0,
+            name='translation-backfill'
+        )
+        
+    def _model_name(self, key):
+        # Try to find a direct model or fallback
+        return self.model_maps.get(key) or f"Helsinki-NLP/opus-mt-{key}"
+    
+    def _cache_model_name(self, key):
+        # Quantized models can word things differently, so they get their own cache entries
+        model_name = self._model_name(key)
+        return model_name if self.inference_mode == 'fp32' else f"{model_name}@{self.inference_mode}"
+        
+    def _load_pretrained(self, model_name):
+        tokenizer = MarianTokenizer.from_pretrained(model_name)
+        model = MarianMTModel.from_pretrained(model_name).to(self.device)
+        model.eval()
+        
+        if self.inference_mode == 'int8':
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif self.inference_mode == 'bf16':
+            model = model.to(torch.bfloat16)
+        return tokenizer, model
+        
     def _load_model(self, source, target):
         key = f"{source}-{target}"
-        if key not in self.models:
-            model_name = self.model_maps.get(key)
-            if not model_name:
-                # Try to find a direct model or fallback
-                model_name = f"Helsinki-NLP/opus-mt-{source}-{target}"
-            
-            try:
-                print(f"Loading translation model: {model_name}...")
-                self.tokenizers[key] = MarianTokenizer.from_pretrained(model_name)
-                self.models[key] = MarianMTModel.from_pretrained(model_name).to(self.device)
-            except Exception as e:
-                print(f"Error loading model {model_name}: {e}")
-                return False
-        return True
+        return self.registry.get(key, self._model_name(key)) is not None
 
     def detect_language(self, text):
-        try:
-            return langdetect.detect(text)
-        except:
-            return 'fr' # Default
+        # Script ranges first, cached n-gram model only for Latin-script ambiguity
+        return detect_language(text, default='fr')
 
-    def translate(self, text, source_lang, target_lang):
+    def translate(self, text, source_lang, target_lang, cancel=None, background=False):
+        """Translate text; background work (ingest backfill) uses its own batcher"""
         if source_lang == target_lang:
             return text
             
         # Check if direct translation is possible/loaded
         if self._load_model(source_lang, target_lang):
-            return self._perform_translation(text, f"{source_lang}-{target_lang}")
+            return self._perform_translation(text, f"{source_lang}-{target_lang}", cancel, background)
             
         # Pivot through English if needed (e.g. Ar -> Fr via En)
         if source_lang != 'en' and target_lang != 'en':
-            step1 = self.translate(text, source_lang, 'en')
-            return self.translate(step1, 'en', target_lang)
+            step1 = self.translate(text, source_lang, 'en', cancel, background)
+            return self.translate(step1, 'en', target_lang, cancel, background)
             
         return text # Fail safe
 
-    def _perform_translation(self, text, key):
-        tokenizer = self.tokenizers[key]
-        model = self.models[key]
+    def translate_stream(self, tokens, source_lang, target_lang, cancel=None):
+        """Translate a token stream, yielding each sentence as soon as it is complete"""
+        if source_lang == target_lang:
+            yield from tokens
+            return
         
-        # Tokenize
-        encoded = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512).to(self.device)
+        buffer = ''
+        for token in tokens:
+            buffer += token
+            # Only cut at a separator followed by more text, so the separator is complete
+            boundary = None
+            for match in SEGMENT_SEPARATOR.finditer(buffer):
+                if match.end() < len(buffer):
+                    boundary = match
+            if boundary is None:
+                continue
+            
+            complete, separator = buffer[:boundary.start()], boundary.group()
+            buffer = buffer[boundary.end():]
+            if complete.strip():
+                yield self.translate(complete, source_lang, target_lang, cancel) + (separator if '\n' in separator else ' ')
         
-        # Translate
-        generated_tokens = model.generate(**encoded)
+        # A cancelled stream stops early; its unfinished sentence is not worth translating
+        if buffer.strip() and not (cancel is not None and cancel.cancelled):
+            yield self.translate(buffer, source_lang, target_lang, cancel)
+
+    def _perform_translation(self, text, key, cancel=None, background=False):
+        """Translate text sentence by sentence so long answers are never truncated"""
+        source, target = key.split('-', 1)
+        model_name = self._cache_model_name(key)
+        parts = self._split_segments(text)
+        
+        # Look up each distinct sentence in the cache; only misses reach the model
+        translations = {}
+        missing = []
+        for segment, is_separator in parts:
+            if is_separator or segment in translations or segment in missing:
+                continue
+            cached = self.cache.get(segment, source, target, model_name)
+            if cached is not None:
+                translations[segment] = cached
+            else:
+                missing.append(segment)
+        
+        if missing:
+            batcher = self.backfill_batcher if background else self.batcher
+            for segment, translation in zip(missing, batcher.translate(missing, key, cancel)):
+                translations[segment] = translation
+                self.cache.put(segment, source, target, model_name, translation)
+        
+        # Reassemble in the original order, keeping line breaks
+        return ''.join(
+            (segment if '\n' in segment else ' ') if is_separator else translations[segment]
+            for segment, is_separator in parts
+        ).strip()
+
+    def _split_segments(self, text):
+        """Split text into (segment, is_separator) parts; sentences are translated, separators kept"""
+        parts = []
+        for i, piece in enumerate(SEGMENT_SEPARATOR.split(text)):
+            if i % 2:
+                parts.append((piece, True))
+                continue
+            piece = piece.strip()
+            if not piece:
+                continue
+            if parts and not parts[-1][1]:
+                parts.append((' ', True))
+            for j, chunk in enumerate(self._split_long(piece)):
+                if j:
+                    parts.append((' ', True))
+                parts.append((chunk, False))
+        return parts
+
+    def _split_long(self, sentence):
+        """Break a sentence longer than MAX_SEGMENT_CHARS at clause, then word, boundaries"""
+        if len(sentence) <= MAX_SEGMENT_CHARS:
+            return [sentence]
+        
+        chunks = []
+        current = ''
+        for piece in CLAUSE_BREAK.split(sentence):
+            words = piece.split() if len(piece) > MAX_SEGMENT_CHARS else [piece]
+            for word in words:
+                if current and len(current) + len(word) + 1 > MAX_SEGMENT_CHARS:
+                    chunks.append(current)
+                    current = word
+                else:
+                    current = f"{current} {word}" if current else word
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _generate_batch(self, segments, key):
+        """Translate segments as padded batches through model.generate, preserving order"""
+        entry = self.registry.get(key, self._model_name(key))
+        if entry is None:
+            raise RuntimeError(f"Translation model for {key} is unavailable")
+        tokenizer, model = entry
+        
+        # Sort by length so each batch carries little padding
+        order = sorted(range(len(segments)), key=lambda i: len(segments[i]))
+        results = [None] * len(segments)
+        
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            batch = [segments[i] for i in batch_ids]
+            
+            # Tokenize
+            encoded = tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=512).to(self.device)
+            
+            # Translate
+            with torch.inference_mode():
+                generated_tokens = model.generate(**encoded)
+            
+            # Decode
+            for i, translation in zip(batch_ids, tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)):
+                results[i] = translation
         
-        # Decode
-        return tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)[0]
+        return results
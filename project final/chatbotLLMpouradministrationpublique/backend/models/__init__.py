@@ -2,6 +2,8 @@ from models.user import User
 from models.conversation import Conversation
 from models.message import Message
 from models.document import Document
+from models.document_chunk import DocumentChunk
+from models.document_translation import DocumentTranslation
 
-__all__ = ['User', 'Conversation', 'Message', 'Document']
+__all__ = ['User', 'Conversation', 'Message', 'Document', 'DocumentChunk', 'DocumentTranslation']
 
@@ -8,6 +8,8 @@ class Conversation(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     title = db.Column(db.String(255))
     language = db.Column(db.String(10), default='fr')  # fr, ar, am, en
+    summary = db.Column(db.Text)  # rolling summary of messages up to summary_until_id
+    summary_until_id = db.Column(db.Integer)  # last message folded into the summary
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
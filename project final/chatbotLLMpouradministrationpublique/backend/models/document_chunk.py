@@ -0,0 +1,35 @@
+from datetime import datetime
+from database import db
+
+class DocumentChunk(db.Model):
+    __tablename__ = 'document_chunks'
+    __table_args__ = (db.UniqueConstraint('document_id', 'position', name='uq_document_chunk_position'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)  # order of the passage inside the document
+    start_offset = db.Column(db.Integer, nullable=False)  # character offsets into Document.content
+    end_offset = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    content_hash = db.Column(db.String(64), index=True)  # sha256 of content, keys document_translations
+    language = db.Column(db.String(10), default='fr')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Chunk rows are written by the Document flush hooks, so the parent does not own a collection
+    document = db.relationship('Document', lazy='joined')
+    
+    def to_dict(self):
+        """Convert chunk to dictionary"""
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'position': self.position,
+            'start_offset': self.start_offset,
+            'end_offset': self.end_offset,
+            'content': self.content,
+            'content_hash': self.content_hash,
+            'language': self.language
+        }
+    
+    def __repr__(self):
+        return f'<DocumentChunk {self.document_id}:{self.position}>'
@@ -0,0 +1,29 @@
+from datetime import datetime
+from database import db
+
+class DocumentTranslation(db.Model):
+    __tablename__ = 'document_translations'
+    __table_args__ = (
+        db.UniqueConstraint('content_hash', 'source_language', 'target_language', name='uq_document_translation'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)  # sha256 of the source passage
+    source_language = db.Column(db.String(10), nullable=False)
+    target_language = db.Column(db.String(10), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert translation to dictionary"""
+        return {
+            'id': self.id,
+            'content_hash': self.content_hash,
+            'source_language': self.source_language,
+            'target_language': self.target_language,
+            'content': self.content,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<DocumentTranslation {self.content_hash[:8]} {self.source_language}->{self.target_language}>'
@@ -0,0 +1,96 @@
+"""
+Benchmark Translation - Compare MarianMT inference modes on the seed documents
+Reports latency, model memory and output agreement of int8/bf16 against the fp32 baseline
+"""
+import sys
+import os
+import time
+import argparse
+import difflib
+import statistics
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from models.document import Document
+from llm.translation_cache import TranslationCache
+from llm.translation_service import TranslationService, INFERENCE_MODES
+
+def load_workload(limit=None):
+    """Translation jobs from the seeded documents: to French, and French answers to Arabic"""
+    app = create_app()
+    with app.app_context():
+        documents = Document.query.filter_by(active=True).all()
+        jobs = []
+        for doc in documents:
+            if doc.language == 'fr':
+                jobs.append((doc.content, 'fr', 'ar'))
+            else:
+                jobs.append((doc.content, doc.language, 'fr'))
+    return jobs[:limit] if limit else jobs
+
+def run_mode(mode, jobs):
+    """Translate every job with a fresh, uncached service in the given mode"""
+    service = TranslationService(inference_mode=mode)
+    service.cache = TranslationCache(None, memory_entries=0)
+
+    # Warm up: load every language pair before timing
+    for _, source, target in jobs:
+        service.translate("Bonjour.", source, target)
+
+    outputs = []
+    durations = []
+    for text, source, target in jobs:
+        start_time = time.perf_counter()
+        outputs.append(service.translate(text, source, target))
+        durations.append(time.perf_counter() - start_time)
+
+    return {
+        "outputs": outputs,
+        "durations": durations,
+        "memory_mb": service.registry.memory_bytes() / 1024 / 1024
+    }
+
+def agreement(baseline, outputs):
+    """Exact-match rate and mean character similarity against the baseline"""
+    exact = sum(1 for a, b in zip(baseline, outputs) if a == b) / len(baseline)
+    similarity = statistics.mean(
+        difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(baseline, outputs)
+    )
+    return exact, similarity
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', nargs='+', default=list(INFERENCE_MODES), choices=INFERENCE_MODES)
+    parser.add_argument('--limit', type=int, default=None, help="Only use the first N documents")
+    args = parser.parse_args()
+
+    modes = ['fp32'] + [m for m in args.modes if m != 'fp32']
+    jobs = load_workload(args.limit)
+    if not jobs:
+        print("No documents found. Run scripts/seed_documents.py first.")
+        return
+
+    print("=" * 80)
+    print(f"TRANSLATION INFERENCE BENCHMARK ({len(jobs)} documents)")
+    print("=" * 80)
+
+    results = {}
+    for mode in modes:
+        print(f"\n⏳ Running {mode}...")
+        results[mode] = run_mode(mode, jobs)
+
+    baseline = results['fp32']
+    print(f"\n{'Mode':<8}{'Mean (s)':>10}{'p50 (s)':>10}{'p95 (s)':>10}{'Speedup':>10}{'Memory (MB)':>13}{'Exact':>8}{'Similar':>9}")
+    print("-" * 78)
+    for mode in modes:
+        result = results[mode]
+        durations = sorted(result["durations"])
+        mean = statistics.mean(durations)
+        p50 = durations[len(durations) // 2]
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        speedup = statistics.mean(baseline["durations"]) / mean if mean else 0
+        exact, similarity = agreement(baseline["outputs"], result["outputs"])
+        print(f"{mode:<8}{mean:>10.3f}{p50:>10.3f}{p95:>10.3f}{speedup:>9.2f}x{result['memory_mb']:>13.0f}{exact:>8.0%}{similarity:>9.1%}")
+
+if __name__ == "__main__":
+    main()
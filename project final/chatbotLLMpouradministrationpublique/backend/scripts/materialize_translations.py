@@ -0,0 +1,28 @@
+"""
+Script to chunk documents and precompute their French translations
+Run it after bulk-loading documents so queries never translate passages inline
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.chat_service import rag_service_singleton
+
+def materialize_translations():
+    """Chunk any unchunked documents and translate all pending passages"""
+    app = create_app()
+    
+    with app.app_context():
+        rag_service_singleton.index_sync.backfill_chunks()
+        
+        pending = rag_service_singleton.materializer.pending_query().count()
+        print(f"{pending} passages waiting for translation")
+        
+        stored = rag_service_singleton.materializer.materialize()
+        print(f"Stored {stored} translations")
+
+if __name__ == '__main__':
+    materialize_translations()
@@ -0,0 +1,38 @@
+"""
+Script to add the rolling summary columns to an existing conversations table
+db.create_all() only creates missing tables, so databases created before
+the summary columns existed need this once
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from app import create_app
+from database import db
+
+COLUMNS = {
+    'summary': 'TEXT',
+    'summary_until_id': 'INTEGER'
+}
+
+def migrate():
+    """Add any missing summary column to conversations"""
+    app = create_app()
+
+    with app.app_context():
+        existing = {column['name'] for column in inspect(db.engine).get_columns('conversations')}
+        missing = [name for name in COLUMNS if name not in existing]
+        if not missing:
+            print("✓ conversations already has the summary columns")
+            return
+
+        with db.engine.begin() as connection:
+            for name in missing:
+                connection.execute(text(f"ALTER TABLE conversations ADD COLUMN {name} {COLUMNS[name]}"))
+                print(f"✓ Added conversations.{name}")
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,96 @@
+"""
+Test Ollama Pool - Exercise multi-backend routing against local stub servers
+No real Ollama needed: each stub answers /api/tags, /api/ps and /api/chat
+with a fixed latency, so routing, failover and load spreading can be checked
+"""
+import sys
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm.ollama_pool import OllamaPool
+
+MODEL = "qwen2.5:7b"
+
+def start_stub(port: int, latency: float, models=(MODEL,), loaded=()):
+    """Start a stub Ollama server on localhost:port"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, payload):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(json.dumps(payload).encode())
+
+        def do_GET(self):
+            if self.path == '/api/tags':
+                self._send({'models': [{'name': name} for name in models]})
+            elif self.path == '/api/ps':
+                self._send({'models': [{'name': name} for name in loaded]})
+            else:
+                self.send_response(404)
+                self.end_headers()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            time.sleep(latency)
+            self._send({'message': {'content': f'réponse de {port}'}, 'done': True})
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run_load(pool: OllamaPool, requests: int, concurrency: int):
+    """Send concurrent chats and count answers per backend"""
+    def ask(_):
+        return pool.chat(MODEL, [{"role": "user", "content": "Bonjour"}], max_tokens=10)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        answers = list(executor.map(ask, range(requests)))
+    counts = {}
+    for answer in answers:
+        counts[answer] = counts.get(answer, 0) + 1
+    return counts
+
+def main():
+    print("=" * 80)
+    print("OLLAMA POOL ROUTING TEST (stub servers)")
+    print("=" * 80)
+
+    # Two fast backends, one slow, one that is not running at all
+    servers = [start_stub(18501, 0.05), start_stub(18502, 0.05), start_stub(18503, 0.3)]
+    pool = OllamaPool([f"http://127.0.0.1:{port}" for port in (18501, 18502, 18503, 18504)])
+    pool.check_ollama_running()
+
+    print("\n1. Least-outstanding routing, one backend down")
+    start_time = time.perf_counter()
+    counts = run_load(pool, requests=60, concurrency=12)
+    print(f"   {counts} in {time.perf_counter() - start_time:.2f}s")
+    print(f"   failed: {counts.get(None, 0)} (expected 0), slow backend got the fewest answers")
+
+    print("\n2. Preference for a backend with the model already loaded")
+    servers.append(start_stub(18505, 0.05, loaded=(MODEL,)))
+    pool = OllamaPool([f"http://127.0.0.1:{port}" for port in (18501, 18505)])
+    pool.check_ollama_running()
+    counts = run_load(pool, requests=10, concurrency=1)
+    print(f"   {counts} (sequential requests should all go to 18505)")
+
+    print("\n3. Failover when a backend dies")
+    servers[0].shutdown()
+    servers[0].server_close()
+    pool = OllamaPool([f"http://127.0.0.1:{port}" for port in (18501, 18502)])
+    counts = run_load(pool, requests=20, concurrency=4)
+    print(f"   {counts} (all answered by 18502)")
+
+    print("\nBackend stats:")
+    for backend in pool.stats()['backends']:
+        print(f"   {backend['base_url']}: healthy={backend['healthy']} "
+              f"circuit={backend['circuit']['state']} requests={backend['requests']}")
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,27 @@ from models.conversation import Conversation
 from models.message import Message
 from database import db
 from llm.rag_service import RAGService
+from llm.cancellation import CancellationRegistry
+from llm.generation_limiter import OllamaOverloadedError
 
 # Initialize RAG Service globally to avoid reloading models on every request
 # This will happen when the module is imported (at app startup if imported)
 rag_service_singleton = RAGService()
 
+# One running turn per (user, conversation), or per user for a new conversation:
+# a resent message cancels the previous one
+active_turns = CancellationRegistry()
+
 class ChatService:
     def __init__(self):
         self.rag_service = rag_service_singleton
     
-    def process_message(self, user_id: int, message_content: str, conversation_id: int = None, language: str = None):
-        """Process user message and generate response"""
-        # Detect language if not provided
+    def _start_turn(self, user_id: int, message_content: str, conversation_id: int = None, language: str = None):
+        """Resolve language and conversation, load history and save the user message"""
+        # Detect language once for the whole pipeline
+        detected_language = self.rag_service.detect_language(message_content)
         if not language:
-            language = self.rag_service.detect_language(message_content)
+            language = detected_language
         
         # Get or create conversation
         if conversation_id:
@@ -35,15 +42,13 @@ class ChatService:
             db.session.add(conversation)
             db.session.commit()
         
-        # Get conversation history for context
-        history_messages = Message.query.filter_by(
-            conversation_id=conversation.id
-        ).order_by(Message.created_at).all()
+        # Messages not yet folded into the summary (the summary stands in for the rest)
+        history_messages = self.rag_service.summarizer.recent_messages(conversation)
         
-        # Convert to simple format for LLM
+        # Convert to simple format for LLM (all of it is sent, trimmed only to the token budget)
         conversation_history = [
             {"role": msg.role, "content": msg.content}
-            for msg in history_messages[-6:]  # Last 6 messages
+            for msg in history_messages
         ]
         
         # Save user message
@@ -55,23 +60,29 @@ class ChatService:
         db.session.add(user_message)
         db.session.commit()
         
-        # Generate response using RAG with conversation history
-        rag_result = self.rag_service.retrieve_and_generate(
-            message_content,
-            language,
-            conversation_history=conversation_history
-        )
+        # A first message has no conversation yet, so its resend is matched by user
+        cancel = active_turns.begin((user_id, conversation.id if conversation_id else None))
+        return conversation, conversation_history, language, detected_language, cancel
+    
+    def _finish_turn(self, conversation: Conversation, message_content: str, rag_result: dict, cancel=None):
+        """Save the assistant response (partial if the turn was cancelled) and update the conversation"""
+        if cancel is not None:
+            active_turns.end(cancel)
         
-        # Save assistant response
         assistant_message = Message(
             conversation_id=conversation.id,
             content=rag_result["answer"],
             role='assistant'
         )
-        assistant_message.set_metadata({
+        metadata = {
             "sources": rag_result["sources"],
             "language": rag_result["language"]
-        })
+        }
+        if rag_result.get("cancelled"):
+            metadata["cancelled"] = True
+        if rag_result.get("untranslated"):
+            metadata["untranslated"] = True  # partial answer left in the model's language
+        assistant_message.set_metadata(metadata)
         db.session.add(assistant_message)
         
         # Update conversation
@@ -80,12 +91,99 @@ class ChatService:
             conversation.title = message_content[:50]
         db.session.commit()
         
-        return {
+        # Fold older turns into the summary off the request path
+        self.rag_service.summarizer.schedule(conversation.id)
+        
+        result = {
             "conversation_id": conversation.id,
             "response": rag_result["answer"],
             "sources": rag_result["sources"],
             "language": rag_result["language"]
         }
+        for flag in ("cancelled", "untranslated"):
+            if rag_result.get(flag):
+                result[flag] = True
+        return result
+    
+    def process_message(self, user_id: int, message_content: str, conversation_id: int = None, language: str = None):
+        """Process user message and generate response"""
+        conversation, conversation_history, language, detected_language, cancel = self._start_turn(
+            user_id, message_content, conversation_id, language
+        )
+        
+        # Generate response using RAG with conversation history
+        try:
+            rag_result = self.rag_service.retrieve_and_generate(
+                message_content,
+                language,
+                conversation_history=conversation_history,
+                detected_language=detected_language,
+                conversation_id=conversation.id,
+                conversation_summary=conversation.summary,
+                cancel=cancel
+            )
+        except OllamaOverloadedError:
+            active_turns.end(cancel)
+            raise
+        
+        return self._finish_turn(conversation, message_content, rag_result, cancel)
+    
+    def process_message_stream(self, user_id: int, message_content: str, conversation_id: int = None, language: str = None):
+        """
+        Streaming variant of process_message.
+        
+        Yields:
+            {"type": "start"} with the conversation id, {"type": "token"} events
+            with answer text, then {"type": "done"} with the persisted result
+        
+        Closing the generator (the client disconnected) cancels the turn and
+        persists the text already sent as a cancelled answer.
+        """
+        conversation, conversation_history, language, detected_language, cancel = self._start_turn(
+            user_id, message_content, conversation_id, language
+        )
+        
+        events = self.rag_service.retrieve_and_generate_stream(
+            message_content,
+            language,
+            conversation_history=conversation_history,
+            detected_language=detected_language,
+            conversation_id=conversation.id,
+            conversation_summary=conversation.summary,
+            cancel=cancel
+        )
+        rag_result = None
+        sources = []
+        sent = []
+        try:
+            yield {"type": "start", "conversation_id": conversation.id}
+            for event, payload in events:
+                if event == "token":
+                    sent.append(payload)
+                    yield {"type": "token", "content": payload}
+                elif event == "sources":
+                    sources = payload
+                elif event == "done":
+                    rag_result = payload
+        except OllamaOverloadedError:
+            active_turns.end(cancel)
+            raise
+        except GeneratorExit:
+            # Stop Ollama and the translation batches before saving what the client saw
+            cancel.cancel('client disconnected')
+            events.close()
+            print(f"Client left conversation {conversation.id}; keeping the partial answer")
+            self._finish_turn(conversation, message_content, {
+                "answer": "".join(sent).strip(),
+                "sources": sources,
+                "language": language,
+                "cancelled": True
+            }, cancel)
+            return
+        
+        # The final message is persisted only once generation has finished
+        result = self._finish_turn(conversation, message_content, rag_result, cancel)
+        yield dict(result, type="done")
     
     def get_conversation_history(self, conversation_id: int, user_id: int):
         """Get conversation history"""
@@ -124,22 +124,45 @@ function ChatInterface({ conversationId, onConversationChange, language, onLangu
     setMessages(prev => [...prev, userMessage])
     setLoading(true)
 
+    const assistantId = `stream-${Date.now()}`
+
     try {
-      const response = await chatService.sendMessage(
+      // Show tokens as they arrive instead of waiting for the full answer
+      const response = await chatService.streamMessage(
         messageText,
         currentConversationId,
-        language
+        language,
+        {
+          onToken: (token) => {
+            setMessages(prev => {
+              if (!prev.some(msg => msg.id === assistantId)) {
+                return [...prev, {
+                  id: assistantId,
+                  role: 'assistant',
+                  content: token,
+                  created_at: new Date().toISOString()
+                }]
+              }
+              return prev.map(msg =>
+                msg.id === assistantId ? { ...msg, content: msg.content + token } : msg
+              )
+            })
+          }
+        }
       )
 
       const assistantMessage = {
-        id: response.conversation_id + Date.now(),
+        id: assistantId,
         role: 'assistant',
         content: response.response,
         metadata: { sources: response.sources },
         created_at: new Date().toISOString()
       }
 
-      setMessages(prev => [...prev, assistantMessage])
+      setMessages(prev => [
+        ...prev.filter(msg => msg.id !== assistantId),
+        assistantMessage
+      ])
 
       if (!currentConversationId || currentConversationId !== response.conversation_id) {
         setCurrentConversationId(response.conversation_id)
@@ -157,7 +180,7 @@ function ChatInterface({ conversationId, onConversationChange, language, onLangu
         error: true,
         created_at: new Date().toISOString()
       }
-      setMessages(prev => [...prev, errorMessage])
+      setMessages(prev => [...prev.filter(msg => msg.id !== assistantId), errorMessage])
     } finally {
       setLoading(false)
     }
@@ -196,7 +219,9 @@ function ChatInterface({ conversationId, onConversationChange, language, onLangu
             </div>
           )}
           <MessageList messages={messages} language={language} />
-          {loading && <LoadingIndicator>{t.thinking}</LoadingIndicator>}
+          {loading && messages[messages.length - 1]?.role !== 'assistant' && (
+            <LoadingIndicator>{t.thinking}</LoadingIndicator>
+          )}
           <div ref={messagesEndRef} />
         </MessagesArea>
         <MessageInput
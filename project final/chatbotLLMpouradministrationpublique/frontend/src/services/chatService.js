@@ -28,6 +28,66 @@ export const chatService = {
     return response.data
   },
 
+  // Streams the answer over Server-Sent Events; axios cannot read a streamed body,
+  // so this uses fetch and parses the event stream by hand
+  async streamMessage(message, conversationId = null, language = null, handlers = {}) {
+    const token = localStorage.getItem('token')
+    const response = await fetch(`${API_URL}/api/chat/message/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {})
+      },
+      body: JSON.stringify({
+        message,
+        conversation_id: conversationId,
+        language
+      }),
+      signal: handlers.signal
+    })
+
+    if (!response.ok || !response.body) {
+      throw new Error(`Stream request failed: ${response.status}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let result = null
+
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      // Events are separated by a blank line
+      let boundary
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+
+        const dataLine = rawEvent.split('\n').find(line => line.startsWith('data: '))
+        if (!dataLine) continue
+        const event = JSON.parse(dataLine.slice(6))
+
+        if (event.type === 'start') {
+          handlers.onStart?.(event)
+        } else if (event.type === 'token') {
+          handlers.onToken?.(event.content)
+        } else if (event.type === 'done') {
+          result = event
+        } else if (event.type === 'error') {
+          throw new Error(event.error)
+        }
+      }
+    }
+
+    if (!result) {
+      throw new Error('Stream ended before the answer was complete')
+    }
+    return result
+  },
+
   async getConversations() {
     const response = await api.get('/api/chat/conversations')
     return response.data.conversations